@@ -5,3 +5,6 @@ class ApiConfig(AppConfig):
     name = 'api'
     verbose_name = 'API'
     default_auto_field = 'django.db.models.BigAutoField'
+
+    def ready(self):
+        from . import signals  # noqa: F401
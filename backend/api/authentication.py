@@ -0,0 +1,129 @@
+import time
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class TokenUserCache:
+    """Tokens with their users, so authentication skips the token query.
+
+    Entries live in the ``tokens`` cache alias, which bounds their number
+    (MAX_ENTRIES locally, the eviction policy of the shared backend in
+    production), and expire after ``AUTH_TOKEN_CACHE_TIMEOUT`` seconds.
+    Without a shared backend the alias is a dummy cache, and nothing is
+    cached: evictions in one worker would not reach the others.
+
+    Keys are digests, so raw tokens never reach the cache. Each entry is
+    stored with the token's version, read before the token was loaded.
+    Deleting a token (logout) or saving its user (password change,
+    deactivation, profile edits) increments the version after the
+    transaction commits, so an entry loaded before that is never used
+    again, even when it is stored afterwards. Hits and misses are counted
+    in the same cache for monitoring.
+    """
+
+    alias = 'tokens'
+    prefix = 'auth:token'
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def enabled(self):
+        return not isinstance(self.cache, DummyCache)
+
+    @property
+    def timeout(self):
+        return settings.AUTH_TOKEN_CACHE_TIMEOUT
+
+    def key(self, token_key):
+        return '{}:{}'.format(
+            self.prefix, sha256(token_key.encode()).hexdigest()
+        )
+
+    def version_key(self, token_key):
+        return f'{self.key(token_key)}:version'
+
+    def _count(self, name):
+        key = f'{self.prefix}:stats:{name}'
+        self.cache.add(key, 0, None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, 1, None)
+
+    def stats(self):
+        keys = [f'{self.prefix}:stats:hits', f'{self.prefix}:stats:misses']
+        values = self.cache.get_many(keys)
+        return {
+            'hits': values.get(keys[0], 0),
+            'misses': values.get(keys[1], 0),
+        }
+
+    def get(self, token_key):
+        """The cached token or None, and the version to store a load under."""
+        key, version_key = self.key(token_key), self.version_key(token_key)
+        found = self.cache.get_many([key, version_key])
+        version = found.get(version_key)
+        if version is None:
+            # Versions start from the current time, so a version key that
+            # expired never comes back with a number an entry still has.
+            self.cache.add(version_key, time.time_ns(), self.timeout)
+            version = self.cache.get(version_key)
+        entry = found.get(key)
+        token = entry[1] if entry is not None and entry[0] == version else None
+        self._count('misses' if token is None else 'hits')
+        return token, version
+
+    def set(self, token, version):
+        self.cache.set(self.key(token.key), (version, token), self.timeout)
+
+    def _bump(self, version_keys):
+        for version_key in version_keys:
+            try:
+                self.cache.incr(version_key)
+            except ValueError:
+                self.cache.add(version_key, time.time_ns(), self.timeout)
+
+    def evict(self, token_keys):
+        if not self.enabled:
+            return
+        version_keys = [
+            self.version_key(token_key) for token_key in token_keys
+        ]
+        if version_keys:
+            transaction.on_commit(lambda: self._bump(version_keys))
+
+    def evict_user(self, user_id):
+        if not self.enabled:
+            return
+        self.evict(
+            Token.objects.filter(user_id=user_id).values_list('key', flat=True)
+        )
+
+
+token_cache = TokenUserCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that reads tokens through ``token_cache``.
+
+    Only tokens of active users are cached; failures always go to the
+    database, so a revoked or unknown token is never served from cache.
+    """
+
+    def authenticate_credentials(self, key):
+        if not token_cache.enabled:
+            return super().authenticate_credentials(key)
+        token, version = token_cache.get(key)
+        if token is not None:
+            return token.user, token
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(token, version)
+        return user, token
@@ -0,0 +1,281 @@
+"""Benchmark scenarios for every operation of the public API schema.
+
+Each scenario names the schema operation it exercises and declares a
+budget: the most SQL queries one request may run. Scenarios run against a
+dataset created by ``generate_dataset``; every request happens inside a
+transaction that is rolled back, so writes leave the data unchanged.
+"""
+import time
+from typing import Callable, NamedTuple, Optional
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Favourite, Ingredient, Recipe, ShoppingCart, Tag
+from rest_framework.authtoken.models import Token
+from users.models import Subscribe
+
+User = get_user_model()
+PASSWORD = 'dataset-password'
+
+
+class Scenario(NamedTuple):
+    name: str
+    method: str
+    path: str
+    budget: int
+    auth: bool = True
+    query: str = ''
+    body: Optional[Callable] = None
+    setup: Optional[Callable] = None
+    status: int = 200
+    target: str = ''
+
+    @property
+    def operation(self):
+        return f'{self.method.upper()} {self.path}'
+
+
+class State:
+    """The dataset rows the scenarios act on."""
+
+    def __init__(self):
+        self.user = User.objects.filter(
+            username__startswith='dataset_', recipes__isnull=False
+        ).order_by('pk').first()
+        if self.user is None:
+            raise LookupError('Сначала выполните generate_dataset.')
+        self.author = User.objects.filter(
+            username__startswith='dataset_', recipes__isnull=False
+        ).exclude(pk=self.user.pk).order_by('pk').first()
+        self.own_recipe = self.user.recipes.order_by('pk').first()
+        self.recipe = self.author.recipes.order_by('pk').first()
+        self.meal_plan = list(
+            Recipe.objects.order_by('pk').values_list('pk', flat=True)[:50]
+        )
+        self.tag = Tag.objects.order_by('pk').first()
+        self.ingredients = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True)[:3]
+        )
+        self.ingredient = Ingredient.objects.get(pk=self.ingredients[0])
+        self.token = Token.objects.get_or_create(user=self.user)[0].key
+
+    def recipe_body(self):
+        return {
+            'name': 'Замер',
+            'text': 'Рецепт для замеров',
+            'cooking_time': 10,
+            'tags': [self.tag.pk],
+            'ingredients': [
+                {'id': pk, 'amount': 10} for pk in self.ingredients
+            ],
+            'image': (
+                'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAA'
+                'AAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+            ),
+        }
+
+
+def _toggle(model, present, **lookup):
+    """Setup putting a favorite/cart/subscription row in the wanted state."""
+
+    def setup(state):
+        values = {
+            key: getattr(state, value) for key, value in lookup.items()
+        }
+        if present:
+            model.objects.get_or_create(**values)
+        else:
+            model.objects.filter(**values).delete()
+    return setup
+
+
+def _ensure_cart(state):
+    ShoppingCart.objects.get_or_create(user=state.user, recipe=state.recipe)
+
+
+SCENARIOS = (
+    Scenario('users list', 'get', '/api/users/', 3),
+    Scenario(
+        'register', 'post', '/api/users/', 5, auth=False, status=201,
+        body=lambda state: {
+            'email': 'benchmark@example.com',
+            'username': 'benchmark',
+            'first_name': 'Замер',
+            'last_name': 'Замеров',
+            'password': 'Benchmark-password-1',
+        },
+    ),
+    Scenario('tags', 'get', '/api/tags/', 0, auth=False),
+    Scenario('tag', 'get', '/api/tags/{id}/', 0, auth=False, target='tag'),
+    Scenario('recipes anonymous', 'get', '/api/recipes/', 0, auth=False),
+    Scenario('recipes', 'get', '/api/recipes/', 6),
+    Scenario(
+        'recipes by tags', 'get', '/api/recipes/', 8,
+        query='tags=breakfast&tags=lunch',
+    ),
+    Scenario(
+        'recipes favorited', 'get', '/api/recipes/', 6,
+        query='is_favorited=1',
+    ),
+    Scenario(
+        'recipes search', 'get', '/api/recipes/', 6, query='search=картофель'
+    ),
+    Scenario('feed', 'get', '/api/recipes/feed/', 6, query='limit=6'),
+    Scenario(
+        'recipe create', 'post', '/api/recipes/', 23, status=201,
+        body=State.recipe_body,
+    ),
+    Scenario(
+        'shopping list', 'get', '/api/recipes/download_shopping_cart/', 3,
+        setup=_ensure_cart,
+    ),
+    Scenario(
+        'shopping list totals', 'get', '/api/recipes/shopping_list/', 2,
+        setup=_ensure_cart,
+    ),
+    Scenario('recipe', 'get', '/api/recipes/{id}/', 5, target='recipe'),
+    Scenario(
+        'recipe update', 'patch', '/api/recipes/{id}/', 35,
+        body=State.recipe_body,
+        target='own_recipe',
+    ),
+    Scenario(
+        'recipe delete', 'delete', '/api/recipes/{id}/', 17, status=204,
+        target='own_recipe',
+    ),
+    Scenario(
+        'favorite', 'post', '/api/recipes/{id}/favorite/', 4, status=201,
+        setup=_toggle(Favourite, False, user='user', recipe='recipe'),
+        target='recipe',
+    ),
+    Scenario(
+        'unfavorite', 'delete', '/api/recipes/{id}/favorite/', 3,
+        status=204,
+        setup=_toggle(Favourite, True, user='user', recipe='recipe'),
+        target='recipe',
+    ),
+    Scenario(
+        'add to cart', 'post', '/api/recipes/{id}/shopping_cart/', 5,
+        status=201,
+        setup=_toggle(ShoppingCart, False, user='user', recipe='recipe'),
+        target='recipe',
+    ),
+    Scenario(
+        'remove from cart', 'delete', '/api/recipes/{id}/shopping_cart/', 4,
+        status=204,
+        setup=_toggle(ShoppingCart, True, user='user', recipe='recipe'),
+        target='recipe',
+    ),
+    Scenario(
+        'meal plan to cart', 'post', '/api/recipes/bulk/', 5,
+        body=lambda state: {
+            'target': 'shopping_cart',
+            'action': 'add',
+            'recipes': state.meal_plan,
+        },
+    ),
+    Scenario('user', 'get', '/api/users/{id}/', 2, target='user'),
+    Scenario('me', 'get', '/api/users/me/', 1),
+    Scenario(
+        'subscriptions', 'get', '/api/users/subscriptions/', 4,
+        query='recipes_limit=3',
+        setup=_toggle(Subscribe, True, subscriber='user', author='author'),
+    ),
+    Scenario(
+        'subscribe', 'post', '/api/users/{id}/subscribe/', 10, status=201,
+        setup=_toggle(Subscribe, False, subscriber='user', author='author'),
+        target='author',
+    ),
+    Scenario(
+        'unsubscribe', 'delete', '/api/users/{id}/subscribe/', 5,
+        status=204,
+        setup=_toggle(Subscribe, True, subscriber='user', author='author'),
+        target='author',
+    ),
+    Scenario('ingredients', 'get', '/api/ingredients/', 0, auth=False),
+    Scenario(
+        'ingredients search', 'get', '/api/ingredients/', 0, auth=False,
+        query='name=карт',
+    ),
+    Scenario(
+        'ingredient', 'get', '/api/ingredients/{id}/', 0, auth=False,
+        target='ingredient',
+    ),
+    Scenario(
+        'set password', 'post', '/api/users/set_password/', 2, status=204,
+        body=lambda state: {
+            'current_password': PASSWORD,
+            'new_password': 'Another-password-1',
+        },
+    ),
+    Scenario(
+        'login', 'post', '/api/auth/token/login/', 3, auth=False,
+        body=lambda state: {'email': state.user.email, 'password': PASSWORD},
+    ),
+    Scenario('logout', 'post', '/api/auth/token/logout/', 2, status=204),
+)
+
+
+def percentile(samples, share):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def run(scenario, state, iterations):
+    """Run a scenario, returning latency percentiles and its query count.
+
+    The first request warms the caches and is not measured. Scenarios that
+    change data run with cold caches, as rolled-back writes could
+    otherwise leave the caches describing rows that do not exist.
+    """
+    client = Client()
+    headers = {}
+    if scenario.auth:
+        headers['HTTP_AUTHORIZATION'] = f'Token {state.token}'
+    path = scenario.path
+    if scenario.target:
+        path = path.replace('{id}', str(getattr(state, scenario.target).pk))
+    if scenario.query:
+        path = f'{path}?{scenario.query}'
+    mutates = scenario.method != 'get' or scenario.setup is not None
+    for alias in ('default', 'memberships'):
+        caches[alias].clear()
+
+    timings, queries = [], []
+    for iteration in range(iterations + 1):
+        with transaction.atomic():
+            if scenario.setup is not None:
+                scenario.setup(state)
+            kwargs = dict(headers)
+            if scenario.body is not None:
+                kwargs['data'] = scenario.body(state)
+                kwargs['content_type'] = 'application/json'
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = getattr(client, scenario.method)(path, **kwargs)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        if response.status_code != scenario.status:
+            raise AssertionError(
+                f'{scenario.name}: {scenario.operation} вернул '
+                f'{response.status_code} вместо {scenario.status}'
+            )
+        if mutates:
+            for alias in ('default', 'memberships'):
+                caches[alias].clear()
+        if iteration:
+            timings.append(elapsed * 1000)
+            queries.append(len(context.captured_queries))
+    return {
+        'operation': scenario.operation,
+        'p50': percentile(timings, 0.5),
+        'p95': percentile(timings, 0.95),
+        'p99': percentile(timings, 0.99),
+        'queries': max(queries),
+        'budget': scenario.budget,
+    }
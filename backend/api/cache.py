@@ -0,0 +1,175 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+from urllib.parse import urlencode
+
+from backend.replicas import primary
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.http import HttpRequest, QueryDict
+from django.urls import reverse
+from recipes.versions import (bump_version, get_versions,
+                              versions_are_shared)
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='warmup')
+
+
+class WarmupRequest(HttpRequest):
+    def __init__(self, base_uri, path, params):
+        super().__init__()
+        scheme, host = base_uri.split('://', 1)
+        self._scheme = scheme
+        self.method = 'GET'
+        self.path = self.path_info = path
+        self.GET = QueryDict(urlencode(params))
+        self.META['HTTP_HOST'] = host.rstrip('/')
+
+    def _get_scheme(self):
+        return self._scheme
+
+
+class RecipeListCache:
+    """Rendered anonymous recipe list pages.
+
+    Keys embed the versions of everything a page depends on: the author or
+    the tags it is filtered by (or every recipe when unfiltered) plus tags,
+    ingredients and author profiles. A change bumps only the affected
+    versions after commit, so stale pages are never read again and simply
+    age out. Versions need a cache every worker shares; without one
+    nothing is cached.
+    """
+
+    prefix = 'recipes:list'
+    timeout = 60 * 60
+    max_hosts = 5
+    global_dependencies = ('tags', 'ingredients', 'authors')
+
+    @property
+    def enabled(self):
+        return versions_are_shared()
+
+    @property
+    def popularity(self):
+        return f'{self.prefix}:popularity'
+
+    def dependencies(self, params):
+        names = []
+        if params.get('ordering') == 'popular':
+            names.append(self.popularity)
+        if params.get('author'):
+            return names + [f'{self.prefix}:author:{params["author"]}']
+        slugs = params.getlist('tags')
+        if slugs:
+            return names + [
+                f'{self.prefix}:tag:{slug}' for slug in sorted(set(slugs))
+            ]
+        return names + [f'{self.prefix}:all']
+
+    def key(self, request):
+        params = request.query_params
+        names = self.dependencies(params) + list(self.global_dependencies)
+        state = (
+            request.build_absolute_uri('/'),
+            sorted((name, sorted(values)) for name, values in params.lists()),
+            get_versions(names),
+        )
+        return '{}:{}'.format(
+            self.prefix, sha1(repr(state).encode()).hexdigest()
+        )
+
+    def _count(self, name):
+        key = f'{self.prefix}:stats:{name}'
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+    def stats(self):
+        keys = [f'{self.prefix}:stats:hits', f'{self.prefix}:stats:misses']
+        values = cache.get_many(keys)
+        return {
+            'hits': values.get(keys[0], 0),
+            'misses': values.get(keys[1], 0),
+        }
+
+    def get(self, key):
+        data = cache.get(key)
+        self._count('misses' if data is None else 'hits')
+        return data
+
+    def set(self, key, request, data):
+        cache.set(key, data, self.timeout)
+        hosts_key = f'{self.prefix}:hosts'
+        hosts = cache.get(hosts_key, ())
+        base_uri = request.build_absolute_uri('/')
+        if base_uri not in hosts:
+            hosts = (base_uri, *hosts)[:self.max_hosts]
+            cache.set(hosts_key, hosts, None)
+
+    def invalidate(self, author_id=None, tag_slugs=()):
+        if not self.enabled:
+            return
+        tag_slugs = tuple(set(tag_slugs))
+        names = [f'{self.prefix}:all']
+        if author_id is not None:
+            names.append(f'{self.prefix}:author:{author_id}')
+        names.extend(f'{self.prefix}:tag:{slug}' for slug in tag_slugs)
+
+        def bump():
+            for name in names:
+                bump_version(name)
+            _executor.submit(self.warm, author_id, tag_slugs)
+
+        transaction.on_commit(bump)
+
+    def invalidate_popularity(self):
+        if not self.enabled:
+            return
+        transaction.on_commit(lambda: bump_version(self.popularity))
+
+    def warm(self, author_id, tag_slugs):
+        """Re-render the first pages an edit has just evicted."""
+        from .views import RecipeViewSet
+
+        variants = [{}]
+        variants.extend({'tags': slug} for slug in tag_slugs)
+        if author_id is not None:
+            variants.append({'author': author_id})
+        try:
+            view = RecipeViewSet.as_view({'get': 'list'})
+            path = reverse('api:recipe-list')
+            for base_uri in cache.get(f'{self.prefix}:hosts', ()):
+                for params in variants:
+                    view(WarmupRequest(base_uri, path, params))
+        except Exception:
+            logger.exception('Не удалось прогреть кэш списка рецептов')
+        finally:
+            connection.close()
+
+
+recipe_list_cache = RecipeListCache()
+
+
+class AnonymousListCacheMixin:
+    """Serves list responses for anonymous users from ``list_cache``."""
+
+    list_cache = recipe_list_cache
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated or not self.list_cache.enabled:
+            return super().list(request, *args, **kwargs)
+        key = self.list_cache.key(request)
+        data = self.list_cache.get(key)
+        if data is not None:
+            return Response(data)
+        # Shared with every anonymous visitor until the versions move on,
+        # so a lagging replica must not fill it.
+        with primary():
+            response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            self.list_cache.set(key, request, response.data)
+        return response
@@ -0,0 +1,62 @@
+from hashlib import sha1
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from recipes.memberships import membership_cache
+from recipes.versions import versions_are_shared
+
+
+def make_etag(*parts):
+    return 'W/"{}"'.format(sha1(repr(parts).encode()).hexdigest())
+
+
+def user_collections_state(request):
+    """Fingerprint of the user's favorites, cart and subscriptions."""
+    memberships = membership_cache.for_request(request)
+    return tuple(
+        tuple(sorted(memberships[kind])) for kind in membership_cache.kinds
+    )
+
+
+class ConditionalGetMixin:
+    """Answers conditional GETs on list/retrieve before any serialization.
+
+    Views provide ``get_validators()`` returning an ``(etag, last_modified)``
+    pair computed without rendering the body; a matching If-None-Match or
+    If-Modified-Since gets a 304 straight away. Validators are built from
+    the versions in ``recipes.versions``, so without a shared cache every
+    request gets the full response and no validators.
+    """
+
+    def get_validators(self):
+        return None, None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def conditional_response(self, view, request, *args, **kwargs):
+        if not versions_are_shared():
+            return view(request, *args, **kwargs)
+        etag, last_modified = self.get_validators()
+        if last_modified is not None:
+            last_modified = int(last_modified)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = view(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            if etag:
+                response.headers['ETag'] = etag
+            if last_modified is not None:
+                response.headers['Last-Modified'] = http_date(last_modified)
+            if self.authentication_classes:
+                patch_vary_headers(response, ('Authorization',))
+        return response
@@ -0,0 +1,83 @@
+import csv
+from datetime import datetime
+from io import BytesIO
+
+from django.conf import settings
+
+CHUNK_SIZE = 64 * 1024
+
+
+class Echo:
+    """File-like object whose write() hands the value straight back."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_list_txt(user, ingredients):
+    today = datetime.today()
+    yield (
+        f'Список покупок для: {user.get_full_name()}\n\n'
+        f'Дата: {today:%Y-%m-%d}\n\n'
+    )
+    for ingredient in ingredients:
+        yield (
+            f'- {ingredient["name"]} '
+            f'({ingredient["measurement_unit"]}) - {ingredient["amount"]}\n'
+        )
+    yield f'\nFoodgram ({today:%Y})'
+
+
+def shopping_list_csv(user, ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['name'],
+            ingredient['measurement_unit'],
+            ingredient['amount'],
+        ))
+
+
+def shopping_list_pdf(user, ingredients):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    font = 'ShoppingListFont'
+    if font not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(font, settings.SHOPPING_LIST_FONT))
+    buffer = BytesIO()
+    page = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    margin, line_height = 50, 18
+    y = height - margin
+
+    def write_line(text, size=12):
+        nonlocal y
+        if y < margin:
+            page.showPage()
+            y = height - margin
+        page.setFont(font, size)
+        page.drawString(margin, y, text)
+        y -= line_height
+
+    write_line(f'Список покупок для: {user.get_full_name()}', 16)
+    write_line(f'Дата: {datetime.today():%Y-%m-%d}')
+    y -= line_height
+    for ingredient in ingredients:
+        write_line(
+            f'• {ingredient["name"]} '
+            f'({ingredient["measurement_unit"]}) - {ingredient["amount"]}'
+        )
+    page.save()
+    buffer.seek(0)
+    yield from iter(lambda: buffer.read(CHUNK_SIZE), b'')
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (shopping_list_txt, 'text/plain; charset=utf-8'),
+    'csv': (shopping_list_csv, 'text/csv; charset=utf-8'),
+    'pdf': (shopping_list_pdf, 'application/pdf'),
+}
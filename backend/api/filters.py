@@ -1,5 +1,8 @@
-from recipes.models import Ingredient, Recipe, Tag
+from recipes import fulltext
+from recipes.models import (Favourite, Ingredient, Recipe, ShoppingCart,
+                            Tag)
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, F, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 
 User = get_user_model()
@@ -9,6 +12,7 @@ class RecipeFilter(FilterSet):
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
+        method='filter_tags',
     )
     
     is_in_shopping_cart = filters.BooleanFilter(
@@ -17,26 +21,50 @@ class RecipeFilter(FilterSet):
     is_favorited = filters.BooleanFilter(
         method='filter_is_favorited'
     )
+    search = filters.CharFilter(
+        method='filter_search'
+    )
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'Сначала популярные'),),
+        method='filter_ordering'
+    )
     
     class Meta:
         fields = ('tags', 'author',)
         model = Recipe
     
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.with_any_tag(value)
+
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if user.is_authenticated and value:
-            return queryset.filter(favorites__user=user)
+            return queryset.filter(Exists(
+                Favourite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ))
         return queryset
     
     def filter_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
         if user.is_authenticated and value:
-            return queryset.filter(shopping_cart__user=user)
+            return queryset.filter(Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ))
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        return fulltext.search(queryset, value).order_by(
+            F('search_rank').desc(nulls_last=True), '-id'
+        )
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by('-favorites_count', '-id')
+
 class IngredientFilter(FilterSet):
     name = filters.CharFilter(
-        field_name='name',
+        field_name='title',
         lookup_expr='istartswith'
     )
     
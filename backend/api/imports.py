@@ -0,0 +1,158 @@
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from recipes import fulltext, timeline
+from recipes.counters import shift
+from recipes.images import schedule_variants
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from rest_framework.parsers import BaseParser
+
+from .cache import recipe_list_cache
+from .serializers import RecipeWriteSerializer
+
+
+class NDJSONParser(BaseParser):
+    """Hands the view a lazy iterator over the lines of the request body."""
+
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return iter(())
+        return iter(stream.readline, b'')
+
+
+def _ids(values):
+    if not isinstance(values, list):
+        return set()
+    return {value for value in values if isinstance(value, int)}
+
+
+def _parse(batch):
+    """Decode a batch of lines, returning payloads and per-line errors."""
+    payloads, errors = [], []
+    for number, line in batch:
+        try:
+            payload = json.loads(line)
+        except ValueError as error:
+            errors.append((number, {'non_field_errors': [str(error)]}))
+            continue
+        if not isinstance(payload, dict):
+            errors.append(
+                (number, {'non_field_errors': ['Ожидался JSON-объект.']})
+            )
+            continue
+        payloads.append((number, payload))
+    return payloads, errors
+
+
+def _import_batch(batch, author, context):
+    payloads, errors = _parse(batch)
+    tag_ids, ingredient_ids = set(), set()
+    for _, payload in payloads:
+        tag_ids |= _ids(payload.get('tags'))
+        ingredient_ids |= _ids([
+            item.get('id') for item in payload.get('ingredients') or ()
+            if isinstance(item, dict)
+        ])
+    tags = Tag.objects.in_bulk(tag_ids)
+    context = dict(context, known_ids={
+        Tag: set(tags),
+        Ingredient: set(
+            Ingredient.objects.filter(
+                id__in=ingredient_ids
+            ).values_list('id', flat=True)
+        ),
+    })
+
+    valid = []
+    for number, payload in payloads:
+        serializer = RecipeWriteSerializer(data=payload, context=context)
+        if serializer.is_valid():
+            valid.append((number, serializer.validated_data))
+        else:
+            errors.append((number, serializer.errors))
+
+    results = {
+        number: {'line': number, 'status': 'error', 'errors': detail}
+        for number, detail in errors
+    }
+    if valid:
+        try:
+            results.update(_save_batch(valid, author, tags))
+        except DatabaseError as error:
+            for number, _ in valid:
+                results[number] = {
+                    'line': number,
+                    'status': 'error',
+                    'errors': {'non_field_errors': [str(error)]},
+                }
+    for number in sorted(results):
+        yield results[number]
+
+
+@transaction.atomic
+def _save_batch(valid, author, tags):
+    recipes = Recipe.objects.bulk_create([
+        Recipe(
+            author=author,
+            tag_mask=sum({tags[tag_id].mask for tag_id in data['tags']}),
+            **{
+                field: value for field, value in data.items()
+                if field not in ('tags', 'ingredients')
+            }
+        )
+        for _, data in valid
+    ])
+    Recipe.tags.through.objects.bulk_create([
+        Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+        for recipe, (_, data) in zip(recipes, valid)
+        for tag_id in data['tags']
+    ])
+    IngredientInRecipe.objects.bulk_create([
+        IngredientInRecipe(
+            recipe_id=recipe.id,
+            ingredient_id=item['id'],
+            amount=item['amount'],
+        )
+        for recipe, (_, data) in zip(recipes, valid)
+        for item in data['ingredients']
+    ])
+    # bulk_create sends no signals, so do what the post_save handlers would.
+    shift('recipes_count', author.id, len(recipes))
+    fulltext.index_recipes([recipe.id for recipe in recipes])
+    timeline.schedule(
+        timeline.fan_out, [recipe.id for recipe in recipes], author.id
+    )
+    for recipe in recipes:
+        schedule_variants(recipe.id)
+    recipe_list_cache.invalidate(
+        author.id, [tag.slug for tag in tags.values()]
+    )
+    return {
+        number: {'line': number, 'status': 'created', 'id': recipe.id}
+        for recipe, (number, _) in zip(recipes, valid)
+    }
+
+
+def import_recipes(lines, author, context, batch_size=None):
+    """Import recipes from NDJSON lines, yielding one result per line.
+
+    Every batch is validated with a couple of queries and written in its own
+    transaction, so a bad line only fails itself and a broken batch does not
+    roll back the batches imported before it.
+    """
+    batch_size = batch_size or settings.RECIPE_IMPORT_BATCH_SIZE
+    numbered = (
+        (number, line)
+        for number, line in enumerate(lines, 1)
+        if line.strip()
+    )
+    while True:
+        batch = list(islice(numbered, batch_size))
+        if not batch:
+            break
+        for result in _import_batch(batch, author, context):
+            yield json.dumps(result, ensure_ascii=False) + '\n'
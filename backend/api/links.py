@@ -0,0 +1,94 @@
+"""Favorite and cart writes as single conflict-tolerant statements.
+
+Adding inserts only the rows that are missing and whose recipe exists,
+removing deletes whatever rows are there, and both return the recipe ids
+they changed: concurrent toggles of one recipe settle on the unique
+constraint instead of failing on it. The statements bypass model signals,
+so the counters, membership sets, popular list and shopping list totals
+are kept current here.
+On PostgreSQL the counter update rides in the same statement.
+"""
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Greatest
+from recipes import shopping_list
+from recipes.memberships import CART, FAVORITES, membership_cache
+from recipes.models import Favourite, Recipe, ShoppingCart
+
+from .cache import recipe_list_cache
+
+# Link model -> (membership kind, Recipe counter column).
+LINKS = {
+    Favourite: (FAVORITES, 'favorites_count'),
+    ShoppingCart: (CART, 'shopping_cart_count'),
+}
+
+
+def _placeholders(count):
+    return ', '.join(['%s'] * count)
+
+
+def _insert_sql(model, count):
+    return (
+        f'INSERT INTO {model._meta.db_table} (user_id, recipe_id)'
+        f' SELECT %s, id FROM {Recipe._meta.db_table}'
+        f' WHERE id IN ({_placeholders(count)})'
+        ' ON CONFLICT DO NOTHING RETURNING recipe_id'
+    )
+
+
+def _delete_sql(model, count):
+    return (
+        f'DELETE FROM {model._meta.db_table}'
+        f' WHERE user_id = %s AND recipe_id IN ({_placeholders(count)})'
+        ' RETURNING recipe_id'
+    )
+
+
+def _counted_sql(sql, field, delta):
+    table = Recipe._meta.db_table
+    return (
+        f'WITH changed AS ({sql})'
+        f' UPDATE {table} SET {field} = GREATEST({field} + {delta:d}, 0)'
+        ' WHERE id IN (SELECT recipe_id FROM changed) RETURNING id'
+    )
+
+
+def _write(model, user_id, recipe_ids, build_sql, delta):
+    kind, field = LINKS[model]
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    if not recipe_ids:
+        return set()
+    sql = build_sql(model, len(recipe_ids))
+    params = [user_id, *recipe_ids]
+    postgres = connection.vendor == 'postgresql'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            _counted_sql(sql, field, delta) if postgres else sql, params
+        )
+        changed = {row[0] for row in cursor.fetchall()}
+    if changed and not postgres:
+        # Like the signal handlers did, the counter follows in autocommit;
+        # recount_counters repairs any drift.
+        Recipe.objects.filter(pk__in=changed).update(
+            **{field: Greatest(F(field) + delta, 0)}
+        )
+    if changed:
+        membership_cache.invalidate(user_id, kind)
+        if model is Favourite:
+            recipe_list_cache.invalidate_popularity()
+        elif delta > 0:
+            shopping_list.add_recipes(user_id, changed)
+        else:
+            shopping_list.remove_recipes(user_id, changed)
+    return changed
+
+
+def add(model, user_id, recipe_ids):
+    """Link the recipes to the user, returning the ids actually added."""
+    return _write(model, user_id, recipe_ids, _insert_sql, 1)
+
+
+def remove(model, user_id, recipe_ids):
+    """Unlink the recipes, returning the ids that were linked."""
+    return _write(model, user_id, recipe_ids, _delete_sql, -1)
@@ -0,0 +1,127 @@
+import json
+from pathlib import Path
+
+import yaml
+from backend.replicas import primary
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from api.benchmarks import SCENARIOS, State, run
+
+SCHEMA = settings.BASE_DIR.parent / 'docs' / 'openapi-schema.yml'
+METHODS = ('get', 'post', 'put', 'patch', 'delete')
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку и число SQL-запросов для каждой операции схемы '
+        'API на данных generate_dataset. Завершается ошибкой при выходе за '
+        'бюджет запросов или регрессии относительно базовой линии.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--schema', default=str(SCHEMA))
+        parser.add_argument('--only', default='')
+        parser.add_argument('--baseline')
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Записать результаты в файл --baseline.'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=1.25,
+            help='Допустимый рост p50 относительно базовой линии.'
+        )
+
+    def operations(self, schema_path):
+        with open(schema_path, encoding='utf-8') as file:
+            schema = yaml.safe_load(file)
+        return {
+            f'{method.upper()} {path}'
+            for path, item in schema['paths'].items()
+            for method in item
+            if method in METHODS
+        }
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations должен быть положительным.')
+        if options['save_baseline'] and not options['baseline']:
+            raise CommandError('Для --save-baseline нужен --baseline.')
+        scenarios = [
+            scenario for scenario in SCENARIOS
+            if options['only'] in scenario.name
+        ]
+        failures = []
+        if not options['only']:
+            covered = {scenario.operation for scenario in SCENARIOS}
+            failures.extend(
+                f'{operation}: нет сценария'
+                for operation in sorted(
+                    self.operations(options['schema']) - covered
+                )
+            )
+
+        baseline = {}
+        baseline_path = options['baseline'] and Path(options['baseline'])
+        if baseline_path and baseline_path.is_file():
+            baseline = json.loads(baseline_path.read_text(encoding='utf-8'))
+
+        results = {}
+        # Requests run inside rolled-back transactions on the primary,
+        # which replicas never see.
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+        ), primary():
+            try:
+                state = State()
+            except LookupError as error:
+                raise CommandError(str(error))
+            for scenario in scenarios:
+                try:
+                    result = run(scenario, state, options['iterations'])
+                except AssertionError as error:
+                    failures.append(str(error))
+                    continue
+                results[scenario.name] = result
+                self.stdout.write(
+                    f'{scenario.name:<22} {result["operation"]:<45} '
+                    f'p50 {result["p50"]:7.1f} мс  '
+                    f'p95 {result["p95"]:7.1f} мс  '
+                    f'p99 {result["p99"]:7.1f} мс  '
+                    f'запросов {result["queries"]}/{result["budget"]}'
+                )
+                failures.extend(self.check_result(
+                    scenario.name, result, baseline.get(scenario.name),
+                    options['threshold'],
+                ))
+
+        if options['save_baseline']:
+            baseline_path.write_text(
+                json.dumps(results, ensure_ascii=False, indent=2),
+                encoding='utf-8',
+            )
+            self.stdout.write(f'Базовая линия записана в {baseline_path}')
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Все операции в бюджете.'))
+
+    def check_result(self, name, result, previous, threshold):
+        if result['queries'] > result['budget']:
+            yield (
+                f'{name}: {result["queries"]} запросов при бюджете '
+                f'{result["budget"]}'
+            )
+        if previous is None:
+            return
+        if result['queries'] > previous['queries']:
+            yield (
+                f'{name}: запросов стало {result["queries"]}, '
+                f'было {previous["queries"]}'
+            )
+        if result['p50'] > previous['p50'] * threshold:
+            yield (
+                f'{name}: p50 {result["p50"]:.1f} мс, '
+                f'было {previous["p50"]:.1f} мс'
+            )
@@ -0,0 +1,118 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import Recipe
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.serializers import ModelSerializer
+from rest_framework.test import APIRequestFactory
+
+from api.benchmarks import percentile
+from api.renderers import ORJSONRenderer
+from api.serializers import RecipeReadSerializer, RecipeShortSerializer
+
+User = get_user_model()
+SERIALIZERS = (RecipeReadSerializer, RecipeShortSerializer)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает сериализацию страницы рецептов через поля DRF и через '
+        'RecipeRows, а отрисовку через json и orjson, на данных '
+        'generate_dataset. Завершается ошибкой, если ответы различаются '
+        'хотя бы на байт или ускорение сериализации ниже --min-speedup.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=50)
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--min-speedup', type=float, default=3.0)
+
+    def handle(self, *args, **options):
+        if min(options['recipes'], options['iterations']) < 1:
+            raise CommandError(
+                '--recipes и --iterations должны быть больше 0.'
+            )
+        user = User.objects.filter(
+            username__startswith='dataset_'
+        ).order_by('pk').first()
+        if user is None:
+            raise CommandError('Сначала выполните generate_dataset.')
+        recipes = list(
+            Recipe.objects.with_related().order_by('-pk')[:options['recipes']]
+        )
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        context = {'request': request}
+
+        failures = []
+        for serializer_class in SERIALIZERS:
+            name = serializer_class.__name__
+            child = serializer_class(context=context)
+
+            def fields(child=child):
+                return [
+                    ModelSerializer.to_representation(child, recipe)
+                    for recipe in recipes
+                ]
+
+            def rows(serializer_class=serializer_class):
+                return serializer_class(
+                    recipes, many=True, context=context
+                ).data
+
+            expected, actual = fields(), rows()
+            expected_body = JSONRenderer().render(expected)
+            actual_body = ORJSONRenderer().render(actual)
+            if expected_body != actual_body:
+                failures.append(f'{name}: ответ отличается от полей DRF')
+                continue
+
+            timings = {
+                'поля DRF': self.measure(fields, options['iterations']),
+                'RecipeRows': self.measure(rows, options['iterations']),
+                'json': self.measure(
+                    lambda: JSONRenderer().render(expected),
+                    options['iterations'],
+                ),
+                'orjson': self.measure(
+                    lambda: ORJSONRenderer().render(actual),
+                    options['iterations'],
+                ),
+            }
+            self.stdout.write(
+                f'{name}, {len(recipes)} рецептов, {len(actual_body)} байт: '
+                + ', '.join(
+                    f'{label} {value:.2f} мс'
+                    for label, value in timings.items()
+                )
+            )
+            speedup = timings['поля DRF'] / timings['RecipeRows']
+            total = (
+                (timings['поля DRF'] + timings['json'])
+                / (timings['RecipeRows'] + timings['orjson'])
+            )
+            self.stdout.write(
+                f'  ускорение сериализации {speedup:.1f}x, отрисовки '
+                f'{timings["json"] / timings["orjson"]:.1f}x, '
+                f'вместе {total:.1f}x'
+            )
+            if speedup < options['min_speedup']:
+                failures.append(
+                    f'{name}: ускорение {speedup:.1f}x ниже '
+                    f'{options["min_speedup"]:.1f}x'
+                )
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Ответы совпадают побайтно.'))
+
+    def measure(self, function, iterations):
+        """Median milliseconds per call, after one warm-up call."""
+        function()
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            function()
+            timings.append((time.perf_counter() - started) * 1000)
+        return percentile(timings, 0.5)
@@ -0,0 +1,181 @@
+import asyncio
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import Favourite, Recipe, ShoppingCart
+from rest_framework.authtoken.models import Token
+
+from api.benchmarks import percentile
+
+User = get_user_model()
+ENDPOINTS = {
+    'favorite': Favourite,
+    'shopping_cart': ShoppingCart,
+}
+
+
+class HTTPConnection:
+    """A minimal keep-alive HTTP/1.1 client on top of asyncio streams."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, token):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        self.writer.write((
+            f'{method} {path} HTTP/1.1\r\n'
+            f'Host: {self.host}:{self.port}\r\n'
+            f'Authorization: Token {token}\r\n'
+            'Content-Length: 0\r\n'
+            'Connection: keep-alive\r\n\r\n'
+        ).encode())
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding') == 'chunked':
+            while size := int((await self.reader.readline()).strip(), 16):
+                await self.reader.readexactly(size + 2)
+            await self.reader.readline()
+        elif status not in (204, 304):
+            await self.reader.read()
+            self.close()
+        if headers.get('connection') == 'close':
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест переключателей избранного и корзины: каждый '
+        'виртуальный пользователь добавляет и убирает рецепт по кругу. '
+        'Запускается против работающего сервера, чтобы сравнить WSGI и '
+        'ASGI развёртывания на одних данных generate_dataset.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--endpoint', choices=ENDPOINTS, default='favorite')
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--timeout', type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        if min(options['concurrency'], options['requests'],
+               options['users']) < 1:
+            raise CommandError(
+                '--concurrency, --requests и --users должны быть больше 0.'
+            )
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Поддерживается только http://хост:порт.')
+        self.base = url.path.rstrip('/')
+        self.address = (url.hostname, url.port or 80)
+        self.timeout = options['timeout']
+        self.endpoint = options['endpoint']
+        pairs = self.prepare(options['users'], options['concurrency'])
+
+        self.statuses, self.latencies = Counter(), []
+        self.remaining = options['requests']
+        started = time.perf_counter()
+        asyncio.run(self.run(pairs))
+        elapsed = time.perf_counter() - started
+
+        done = len(self.latencies)
+        self.stdout.write(
+            f'{self.endpoint}: {done} запросов за {elapsed:.2f} с, '
+            f'{done / elapsed:.0f} запросов/с при '
+            f'{options["concurrency"]} одновременных клиентах'
+        )
+        if self.latencies:
+            self.stdout.write(' '.join(
+                f'{name}={percentile(self.latencies, share):.1f} мс'
+                for name, share in (
+                    ('p50', 0.5), ('p95', 0.95), ('p99', 0.99)
+                )
+            ))
+        self.stdout.write('Статусы: ' + ', '.join(
+            f'{status}: {count}'
+            for status, count in sorted(self.statuses.items(), key=str)
+        ))
+
+    def prepare(self, users, concurrency):
+        """Give every virtual client its own user and recipe pair."""
+        users = list(User.objects.filter(
+            username__startswith='dataset_'
+        ).order_by('pk')[:users])
+        if not users:
+            raise CommandError('Сначала выполните generate_dataset.')
+        per_user = -(-concurrency // len(users))
+        recipes = list(
+            Recipe.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        if len(recipes) < per_user:
+            raise CommandError(
+                f'Для {concurrency} клиентов нужно хотя бы {per_user} '
+                'рецептов.'
+            )
+        tokens = [
+            Token.objects.get_or_create(user=user)[0].key for user in users
+        ]
+        pairs = [
+            (tokens[index % len(users)], recipes[index // len(users)])
+            for index in range(concurrency)
+        ]
+        # Start every pair without the row, so POST and DELETE alternate
+        # between 201 and 204.
+        ENDPOINTS[self.endpoint].objects.filter(
+            user__in=users, recipe_id__in=recipes[:per_user]
+        ).delete()
+        return pairs
+
+    async def run(self, pairs):
+        await asyncio.gather(*(
+            self.client(token, recipe_id) for token, recipe_id in pairs
+        ))
+
+    async def client(self, token, recipe_id):
+        connection = HTTPConnection(*self.address)
+        path = f'{self.base}/api/recipes/{recipe_id}/{self.endpoint}/'
+        method = 'POST'
+        try:
+            while self.remaining > 0:
+                self.remaining -= 1
+                started = time.perf_counter()
+                try:
+                    status = await asyncio.wait_for(
+                        connection.request(method, path, token), self.timeout
+                    )
+                except (OSError, ValueError, IndexError,
+                        asyncio.IncompleteReadError, asyncio.TimeoutError
+                        ) as error:
+                    self.statuses[type(error).__name__] += 1
+                    connection.close()
+                    continue
+                self.latencies.append(
+                    (time.perf_counter() - started) * 1000
+                )
+                self.statuses[status] += 1
+                method = 'DELETE' if method == 'POST' else 'POST'
+        finally:
+            connection.close()
@@ -1,4 +1,97 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+
+
+class IdCursorPagination(CursorPagination):
+    page_size_query_param = 'limit'
+    ordering = '-id'
+
+    def __init__(self, ordering=None):
+        if ordering:
+            self.ordering = ordering
+
 
 class CustomPagination(PageNumberPagination):
+    """Page numbers by default, keyset pagination on demand.
+
+    Passing ``?pagination=cursor`` (or a ``cursor`` obtained from a previous
+    response) switches to an opaque cursor over the primary key, which
+    skips the COUNT query and costs the same on every page. Querysets
+    ordered by anything but the primary key keep page numbers.
+    """
+
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if not self.use_cursor(request):
+            return super().paginate_queryset(queryset, request, view)
+        ordering = (
+            queryset.query.order_by or queryset.model._meta.ordering
+        )
+        if not set(ordering) <= {'id', '-id', 'pk', '-pk'}:
+            # Other orderings are not unique, so keep page numbers for them.
+            return super().paginate_queryset(queryset, request, view)
+        self.cursor_paginator = IdCursorPagination(ordering=tuple(ordering))
+        self.cursor_paginator.page_size = self.get_page_size(request)
+        return self.cursor_paginator.paginate_queryset(
+            queryset, request, view
+        )
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class FeedPagination(CursorPagination):
+    """Keyset pages over ids that come from a function, not a queryset.
+
+    ``paginate_ids`` calls ``fetch(before, limit)`` for up to ``limit``
+    ids below ``before``, newest first; the cursor carries the last id of
+    the page. Pages only go forward, like an infinite feed.
+    """
+
     page_size_query_param = 'limit'
+    ordering = '-id'
+
+    def paginate_ids(self, fetch, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        before = None
+        if cursor is not None:
+            try:
+                before = int(cursor.position)
+            except (TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        ids = fetch(before, self.page_size + 1)
+        self.has_next = len(ids) > self.page_size
+        ids = ids[:self.page_size]
+        self.next_position = ids[-1] if self.has_next else None
+        return ids
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=str(self.next_position))
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
@@ -0,0 +1,52 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+OPTIONS = (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    | orjson.OPT_PASSTHROUGH_DATACLASS
+) if orjson else 0
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer output produced by orjson.
+
+    Compact UTF-8 output of strings, numbers, lists and dicts is the same
+    as the standard library's, and everything else goes through DRF's
+    JSONEncoder. Indented responses (the browsable API), ASCII-only
+    settings, values orjson cannot encode and a missing orjson fall back
+    to JSONRenderer. Floats are written in shortest round-trip form,
+    which only differs from json in the exponent notation, and NaN
+    becomes null; the API schema has no float fields.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if (orjson is None or not self.compact or self.ensure_ascii
+                or not self.strict or self.encoder_class is not JSONEncoder
+                or self.get_indent(accepted_media_type, renderer_context)):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        try:
+            ret = orjson.dumps(data, default=_default, option=OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        # Same as JSONRenderer: U+2028 and U+2029 are valid JSON but not
+        # valid JavaScript.
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+                b'\xe2\x80\xa9', b'\\u2029'
+            )
+        return ret
+
+
+_default = JSONEncoder().default
@@ -1,20 +1,236 @@
+from functools import cache, lru_cache
+from operator import attrgetter
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
+from django.core.signals import setting_changed
 from django.db import transaction
-from django.db.models import F
+from django.db.models.manager import BaseManager
+from django.dispatch import receiver
+from django.utils.encoding import iri_to_uri
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
-from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
-from users.models import Subscribe
-from rest_framework import status
-from rest_framework.serializers import ModelSerializer
+from recipes import shopping_list
+from recipes.images import FORMATS, VARIANTS
+from recipes.memberships import (CART, FAVORITES, SUBSCRIPTIONS,
+                                 membership_cache)
+from recipes.models import (Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingListItem, Tag)
+from rest_framework.serializers import (ListSerializer, ModelSerializer,
+                                        Serializer)
 from rest_framework.exceptions import ValidationError
-from rest_framework.fields import IntegerField, SerializerMethodField
-from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.fields import (CharField, ChoiceField, Field,
+                                   IntegerField, ListField,
+                                   SerializerMethodField)
 
 User = get_user_model()
 
 
+class ImageVariantsField(Field):
+    """URLs of the resized copies, falling back to the original image."""
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.image:
+            return None
+        storage = recipe.image.storage
+        variants = recipe.image_variants or {}
+        request = self.context.get('request')
+        urls = {}
+        for variant in VARIANTS:
+            urls[variant] = {}
+            for image_format in FORMATS:
+                name = variants.get(variant, {}).get(image_format)
+                url = storage.url(name or recipe.image.name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls[variant][image_format] = url
+        return urls
+
+
+@lru_cache(maxsize=8192)
+def _media_url(storage, name):
+    url = storage.url(name)
+    host_relative = (
+        url.startswith('/') and not url.startswith('//')
+        and '/./' not in url and '/../' not in url
+    )
+    return url, iri_to_uri(url) if host_relative else None
+
+
+@receiver(setting_changed)
+def _reset_media_urls(setting, **kwargs):
+    if setting == 'MEDIA_URL':
+        _media_url.cache_clear()
+
+
+class MediaURLs:
+    """File URLs as FileField renders them, with the storage work memoized.
+
+    build_absolute_uri() of a host-relative URL is the quoted scheme and
+    host followed by the quoted URL, so the prefix is built once per
+    request and the URL of each name once per process.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        if request is not None:
+            self.prefix = request.build_absolute_uri('/')[:-1]
+
+    def __call__(self, storage, name):
+        url, quoted = _media_url(storage, name)
+        if self.request is None:
+            return url
+        if quoted is None:
+            return self.request.build_absolute_uri(url)
+        return self.prefix + quoted
+
+
+@cache
+def _plain_fields(serializer_class):
+    """Names of the fields read off the instance, and one getter for all."""
+    fields = serializer_class().fields
+    names = tuple(
+        name for name, field in fields.items() if field.source != '*'
+    )
+    return names, attrgetter(*(fields[name].source for name in names))
+
+
+def _prefetched(instance, name):
+    """Rows prefetched into instance under name, without a related manager."""
+    cache = getattr(instance, '_prefetched_objects_cache', {})
+    if name in cache:
+        return cache[name]
+    return getattr(instance, name).all()
+
+
+class RecipeRows:
+    """Recipe representations built straight from prefetched rows.
+
+    Produces what the recipe serializers render through their declared
+    fields, for the names in ``fields`` and in that order, without binding
+    a field per value: getters are picked once per page, memberships and
+    the URL prefix are resolved once and each tag is rendered once.
+    """
+
+    def __init__(self, fields, context):
+        self.request = context.get('request')
+        self.urls = MediaURLs(self.request)
+        self.getters = [
+            (name, getattr(self, f'get_{name}')) for name in fields
+        ]
+        self.memberships = None
+        self.tags = {}
+
+    def __call__(self, recipe):
+        return {name: get(recipe) for name, get in self.getters}
+
+    def membership(self, kind):
+        if self.memberships is None:
+            self.memberships = membership_cache.for_request(self.request)
+        return self.memberships[kind]
+
+    def get_id(self, recipe):
+        return recipe.id
+
+    def get_name(self, recipe):
+        return recipe.title
+
+    def get_text(self, recipe):
+        return recipe.description
+
+    def get_cooking_time(self, recipe):
+        return recipe.cooking_time
+
+    def get_author(self, recipe):
+        user = recipe.author
+        if user is None:
+            return None
+        names, values = _plain_fields(CustomUserSerializer)
+        row = dict(zip(names, values(user)))
+        # is_subscribed closes CustomUserSerializer.Meta.fields.
+        if hasattr(user, 'is_subscribed'):
+            row['is_subscribed'] = user.is_subscribed
+        else:
+            row['is_subscribed'] = user.id in self.membership(SUBSCRIPTIONS)
+        return row
+
+    def get_tags(self, recipe):
+        rows = []
+        for tag in _prefetched(recipe, 'tags'):
+            row = self.tags.get(tag.id)
+            if row is None:
+                names, values = _plain_fields(TagSerializer)
+                row = self.tags[tag.id] = dict(zip(names, values(tag)))
+            rows.append(dict(row))
+        return rows
+
+    def get_ingredients(self, recipe):
+        rows = []
+        for item in _prefetched(recipe, 'ingredient_list'):
+            ingredient = item.ingredient
+            rows.append({
+                'id': ingredient.id,
+                'name': ingredient.title,
+                'measurement_unit': ingredient.unit,
+                'amount': item.amount,
+            })
+        return rows
+
+    def get_is_favorited(self, recipe):
+        return recipe.id in self.membership(FAVORITES)
+
+    def get_is_in_shopping_cart(self, recipe):
+        return recipe.id in self.membership(CART)
+
+    def get_image(self, recipe):
+        image = recipe.image
+        return self.urls(image.storage, image.name) if image else None
+
+    def get_image_variants(self, recipe):
+        image = recipe.image
+        if not image:
+            return None
+        variants = recipe.image_variants or {}
+        urls = {}
+        for variant in VARIANTS:
+            names = variants.get(variant, {})
+            urls[variant] = {
+                image_format: self.urls(
+                    image.storage, names.get(image_format) or image.name
+                )
+                for image_format in FORMATS
+            }
+        return urls
+
+
+class RowListSerializer(ListSerializer):
+    """Renders a page through one row builder shared by every item."""
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, BaseManager) else data
+        build = self.child.row_builder()
+        return [build(item) for item in iterable]
+
+
+class RecipeRowsMixin:
+    """Serializes recipes through RecipeRows instead of the field loop.
+
+    The declared fields stay the schema; RowListSerializer shares one
+    builder across a page.
+    """
+
+    def row_builder(self):
+        return RecipeRows(self.Meta.fields, self.context)
+
+    def to_representation(self, instance):
+        return self.row_builder()(instance)
+
+
 class CustomUserSerializer(UserSerializer):
     is_subscribed = SerializerMethodField(read_only=True)
 
@@ -30,12 +246,10 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Subscribe.objects.filter(
-            user=user, author=obj
-        ).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        memberships = membership_cache.for_request(self.context['request'])
+        return obj.id in memberships[SUBSCRIPTIONS]
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -49,23 +263,29 @@ class CustomUserCreateSerializer(UserCreateSerializer):
 
 class TagSerializer(ModelSerializer):
     class Meta:
-        fields = '__all__'
+        fields = ('id', 'name', 'color', 'slug')
         model = Tag
 
 
 class IngredientSerializer(ModelSerializer):
+    name = CharField(source='title')
+    measurement_unit = CharField(source='unit')
+
     class Meta:
-        fields = '__all__'
+        fields = ('id', 'name', 'measurement_unit')
         model = Ingredient
 
 
-class RecipeReadSerializer(ModelSerializer):
+class RecipeReadSerializer(RecipeRowsMixin, ModelSerializer):
     author = CustomUserSerializer(read_only=True)
     ingredients = SerializerMethodField()
     tags = TagSerializer(many=True, read_only=True)
     is_in_shopping_cart = SerializerMethodField(read_only=True)
     is_favorited = SerializerMethodField(read_only=True)
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
+    name = CharField(source='title', read_only=True)
+    text = CharField(source='description', read_only=True)
 
     class Meta:
         fields = (
@@ -76,88 +296,71 @@ class RecipeReadSerializer(ModelSerializer):
             'is_in_shopping_cart',
             'is_favorited',
             'image',
+            'image_variants',
             'name',
             'text',
             'cooking_time',
         )
         model = Recipe
+        list_serializer_class = RowListSerializer
 
     def get_ingredients(self, obj):
-        recipe = obj
-        ingredients = recipe.ingredients.values(
-            'id',
-            'name',
-            'measurement_unit',
-            amount=F('ingredientinrecipe__amount')
-        )
-        return ingredients
+        return [
+            {
+                'id': item.ingredient.id,
+                'name': item.ingredient.title,
+                'measurement_unit': item.ingredient.unit,
+                'amount': item.amount,
+            }
+            for item in obj.ingredient_list.all()
+        ]
 
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return user.favorites.filter(recipe=obj).exists()
+        memberships = membership_cache.for_request(self.context['request'])
+        return obj.id in memberships[FAVORITES]
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return user.shopping_cart.filter(recipe=obj).exists()
+        memberships = membership_cache.for_request(self.context['request'])
+        return obj.id in memberships[CART]
 
 
-class RecipeShortSerializer(ModelSerializer):
+class RecipeShortSerializer(RecipeRowsMixin, ModelSerializer):
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
+    name = CharField(source='title', read_only=True)
 
     class Meta:
         fields = (
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time'
         )
         model = Recipe
+        list_serializer_class = RowListSerializer
 
 
-class SubscribeSerializer(CustomUserSerializer):
-    recipes_count = SerializerMethodField()
-    recipes = SerializerMethodField()
+class ShoppingListItemSerializer(ModelSerializer):
+    id = IntegerField(source='ingredient_id')
+    name = CharField(source='ingredient.title')
+    measurement_unit = CharField(source='ingredient.unit')
 
-    class Meta(CustomUserSerializer.Meta):
-        fields = CustomUserSerializer.Meta.fields + (
-            'recipes_count', 'recipes'
-        )
-        read_only_fields = ('email', 'username',)
-
-    def validate(self, data):
-        author = self.instance
-        user = self.context.get('request').user
-        if Subscribe.objects.filter(author=author, user=user).exists():
-            raise ValidationError(
-                detail='Вы уже подписаны на пользователя!',
-                code=status.HTTP_400_BAD_REQUEST
-            )
-        if author == user:
-            raise ValidationError(
-                detail='Вы не можете подписаться на себя!',
-                code=status.HTTP_400_BAD_REQUEST
-            )
-        return data
+    class Meta:
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+        model = ShoppingListItem
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
 
-    def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[:int(limit)]
-        serializer = RecipeShortSerializer(
-            recipes,
-            many=True,
-            read_only=True
-        )
-        return serializer.data
+class RecipeBulkSerializer(Serializer):
+    """A list of recipes to add to or remove from favorites or the cart."""
+
+    target = ChoiceField(choices=('favorite', 'shopping_cart'))
+    action = ChoiceField(choices=('add', 'remove'))
+    recipes = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPE_BULK_MAX_SIZE,
+    )
 
 
 class IngredientInRecipeWriteSerializer(ModelSerializer):
@@ -171,11 +374,10 @@ class IngredientInRecipeWriteSerializer(ModelSerializer):
 class RecipeWriteSerializer(ModelSerializer):
     author = CustomUserSerializer(read_only=True)
     ingredients = IngredientInRecipeWriteSerializer(many=True)
-    tags = PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
+    tags = ListField(child=IntegerField())
     image = Base64ImageField()
+    name = CharField(source='title', max_length=200)
+    text = CharField(source='description')
 
     class Meta:
         fields = (
@@ -190,53 +392,93 @@ class RecipeWriteSerializer(ModelSerializer):
         )
         model = Recipe
 
+    def existing_ids(self, model, ids):
+        # Bulk imports look the ids of a whole batch up in advance.
+        known = self.context.get('known_ids', {}).get(model)
+        if known is not None:
+            return known & ids
+        return set(model.objects.filter(id__in=ids).values_list(
+            'id', flat=True
+        ))
+
     def validate_ingredients(self, value):
         ingredients = value
         if not ingredients:
             raise ValidationError({
                 'ingredients': 'Нужен один и более ингридиент!'
             })
-        ingredients_list = []
-        for item in ingredients:
-            ingredient = get_object_or_404(Ingredient, id=item['id'])
-            if ingredient in ingredients_list:
-                raise ValidationError({
-                    'ingredients': 'Ингридиенты не могут повторяться!'
-                })
-            if int(item['amount']) <= 0:
-                raise ValidationError({
-                    'amount': 'Количество ингридиентов должно быть 1 и более!'
-                })
-            ingredients_list.append(ingredient)
+        ids = {item['id'] for item in ingredients}
+        if len(ids) != len(ingredients):
+            raise ValidationError({
+                'ingredients': 'Ингридиенты не могут повторяться!'
+            })
+        missing = ids - self.existing_ids(Ingredient, ids)
+        if missing:
+            raise ValidationError({
+                'ingredients': f'Ингридиенты не найдены: {sorted(missing)}'
+            })
         return value
 
     def validate_tags(self, value):
         tags = value
         if not tags:
             raise ValidationError({'tags': 'Нужен хотя бы один тег!'})
-        tags_list = []
-        for tag in tags:
-            if tag in tags_list:
-                raise ValidationError({'tags': 'Теги должны быть уникальными!'})
-            tags_list.append(tag)
+        ids = set(tags)
+        if len(ids) != len(tags):
+            raise ValidationError({'tags': 'Теги должны быть уникальными!'})
+        missing = ids - self.existing_ids(Tag, ids)
+        if missing:
+            raise ValidationError({
+                'tags': f'Теги не найдены: {sorted(missing)}'
+            })
         return value
 
-    @transaction.atomic
     def create_ingredients_amounts(self, ingredients, recipe):
         IngredientInRecipe.objects.bulk_create(
             [IngredientInRecipe(
-                ingredient=Ingredient.objects.get(id=ingredient['id']),
+                ingredient_id=ingredient['id'],
                 recipe=recipe,
                 amount=ingredient['amount']
             ) for ingredient in ingredients]
         )
 
+    def update_ingredients_amounts(self, ingredients, recipe):
+        amounts = {item['id']: item['amount'] for item in ingredients}
+        existing = {
+            row.ingredient_id: row for row in recipe.ingredient_list.all()
+        }
+        removed = existing.keys() - amounts.keys()
+        deltas = {pk: -row.amount for pk, row in existing.items()}
+        for ingredient_id, amount in amounts.items():
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) + amount
+        # Carts holding the recipe take the difference, not a recount.
+        shopping_list.change_recipe(recipe.pk, deltas)
+        if removed:
+            IngredientInRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, row in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            IngredientInRecipe.objects.bulk_update(changed, ['amount'])
+        self.create_ingredients_amounts(
+            recipe=recipe,
+            ingredients=[
+                item for item in ingredients
+                if item['id'] not in existing
+            ]
+        )
+
     @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(**validated_data)
         tags = validated_data.pop('tags')
-        recipe.tags.set(tags)
+        recipe = Recipe.objects.create(**validated_data)
+        recipe.tags.add(*tags)
         self.create_ingredients_amounts(
             recipe=recipe,
             ingredients=ingredients
@@ -245,22 +487,22 @@ class RecipeWriteSerializer(ModelSerializer):
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
         instance = super().update(instance, validated_data)
-        instance.tags.clear()
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.create_ingredients_amounts(
-            recipe=instance,
-            ingredients=ingredients
-        )
-        instance.save()
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            self.update_ingredients_amounts(
+                recipe=instance,
+                ingredients=ingredients
+            )
         return instance
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        instance = Recipe.objects.with_related().get(pk=instance.pk)
         return RecipeReadSerializer(
             instance, context=context
         ).data
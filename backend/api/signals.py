@@ -0,0 +1,161 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_init,
+                                      post_save, pre_delete)
+from django.dispatch import receiver
+from recipes.images import variants_ready
+from recipes.models import Favourite, IngredientInRecipe, Recipe, Tag
+from recipes.versions import bump_version
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .cache import recipe_list_cache
+
+User = get_user_model()
+PROFILE_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_saved_recipe(sender, instance, **kwargs):
+    recipe_list_cache.invalidate(
+        instance.author_id, instance.tags.values_list('slug', flat=True)
+    )
+
+
+@receiver(variants_ready, sender=Recipe)
+def invalidate_recipe_images(sender, instance, **kwargs):
+    recipe_list_cache.invalidate(
+        instance.author_id, instance.tags.values_list('slug', flat=True)
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_recipe_tags(sender, instance, **kwargs):
+    instance._tag_slugs = list(instance.tags.values_list('slug', flat=True))
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_deleted_recipe(sender, instance, **kwargs):
+    recipe_list_cache.invalidate(
+        instance.author_id, getattr(instance, '_tag_slugs', ())
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if reverse:
+        # tag.recipes.add()/remove()/clear(): every affected author and
+        # the tag itself change.
+        if action == 'pre_clear':
+            instance._author_ids = set(
+                instance.recipes.values_list('author_id', flat=True)
+            )
+        elif action == 'post_clear':
+            author_ids = getattr(instance, '_author_ids', ())
+        elif action in ('post_add', 'post_remove') and pk_set:
+            author_ids = set(Recipe.objects.filter(
+                pk__in=pk_set
+            ).values_list('author_id', flat=True))
+        else:
+            return
+        if action != 'pre_clear':
+            for author_id in author_ids or (None,):
+                recipe_list_cache.invalidate(author_id, [instance.slug])
+        return
+    if action == 'pre_clear':
+        instance._tag_slugs = list(
+            instance.tags.values_list('slug', flat=True)
+        )
+    elif action == 'post_clear':
+        recipe_list_cache.invalidate(
+            instance.author_id, getattr(instance, '_tag_slugs', ())
+        )
+    elif action in ('post_add', 'post_remove') and pk_set:
+        recipe_list_cache.invalidate(
+            instance.author_id,
+            Tag.objects.filter(pk__in=pk_set).values_list('slug', flat=True)
+        )
+
+
+def _flush_recipe_ingredients(connection):
+    recipe_ids = connection.changed_ingredient_recipes
+    connection.changed_ingredient_recipes = set()
+    if not recipe_ids:
+        return
+    for recipe in Recipe.objects.filter(pk__in=recipe_ids).prefetch_related(
+        'tags'
+    ):
+        recipe_list_cache.invalidate(
+            recipe.author_id, [tag.slug for tag in recipe.tags.all()]
+        )
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def invalidate_recipe_ingredients(sender, instance, using, **kwargs):
+    # Ingredient rows change in batches. Every write schedules a flush and
+    # the first one to run after commit looks all collected recipes up
+    # once; the rest find nothing left. Ids of a rolled-back transaction
+    # only add an extra invalidation to the next flush.
+    connection = transaction.get_connection(using)
+    if not hasattr(connection, 'changed_ingredient_recipes'):
+        connection.changed_ingredient_recipes = set()
+    connection.changed_ingredient_recipes.add(instance.recipe_id)
+    transaction.on_commit(
+        lambda: _flush_recipe_ingredients(connection), using=using
+    )
+
+
+@receiver(post_save, sender=Favourite)
+@receiver(post_delete, sender=Favourite)
+def invalidate_popular_recipes(sender, **kwargs):
+    recipe_list_cache.invalidate_popularity()
+
+
+def _profile(instance):
+    # __dict__ rather than getattr: a deferred field must not be loaded.
+    return {name: instance.__dict__.get(name) for name in PROFILE_FIELDS}
+
+
+@receiver(post_init, sender=User)
+def remember_author_profile(sender, instance, **kwargs):
+    instance._loaded_profile = _profile(instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_profile(sender, instance, created, update_fields,
+                              **kwargs):
+    # Every cached list and ETag depends on the authors version, so
+    # signups, password changes and logins must leave it alone.
+    if update_fields is not None and not PROFILE_FIELDS & set(update_fields):
+        return
+    loaded, instance._loaded_profile = (
+        instance._loaded_profile, _profile(instance)
+    )
+    if not created and loaded != instance._loaded_profile:
+        bump_version('authors')
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_author(sender, **kwargs):
+    bump_version('authors')
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, **kwargs):
+    # djoser's token/logout, and the cascade of a deleted user.
+    token_cache.evict([instance.key])
+
+
+@receiver(post_save, sender=User)
+def evict_saved_user_tokens(sender, instance, created, update_fields,
+                            **kwargs):
+    # Password changes and deactivation go through save(); cached tokens
+    # would otherwise keep the old user until they expire. New users have
+    # no tokens and login only touches last_login.
+    if created or update_fields is not None and (
+        set(update_fields) <= {'last_login'}
+    ):
+        return
+    token_cache.evict_user(instance.pk)
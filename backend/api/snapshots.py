@@ -0,0 +1,102 @@
+import threading
+
+from backend.replicas import primary
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.cache import patch_cache_control
+from recipes.versions import get_version, versions_are_shared
+
+from .renderers import ORJSONRenderer
+
+
+class ReferenceSnapshot:
+    """Pre-rendered JSON of a small, rarely changing table.
+
+    Each worker keeps one rendered fragment per row and the full list, and
+    rebuilds them when the table version in the cache moves on.
+    """
+
+    def __init__(self, name, get_queryset, serializer_class):
+        self.name = name
+        self.get_queryset = get_queryset
+        self.serializer_class = serializer_class
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _build(self, version):
+        renderer = ORJSONRenderer()
+        with primary():
+            rows = self.serializer_class(self.get_queryset(), many=True).data
+        fragments = {row['id']: renderer.render(row) for row in rows}
+        body = b'[' + b','.join(fragments.values()) + b']'
+        return version, fragments, body
+
+    def get(self):
+        version = get_version(self.name)
+        state = self._state
+        if state is not None and state[0] == version:
+            return state
+        with self._lock:
+            if self._state is None or self._state[0] != version:
+                self._state = self._build(version)
+            return self._state
+
+    @property
+    def body(self):
+        return self.get()[2]
+
+    def fragment(self, pk):
+        try:
+            return self.get()[1][int(pk)]
+        except (KeyError, TypeError, ValueError):
+            raise Http404
+
+    def join(self, pks):
+        # The search index and the snapshot are rebuilt independently, so
+        # either may briefly know rows the other does not.
+        fragments = self.get()[1]
+        return b'[' + b','.join(
+            fragments[pk] for pk in pks if pk in fragments
+        ) + b']'
+
+
+class SnapshotViewMixin:
+    """Answers list/retrieve with bytes from ``snapshot``, skipping DRF
+    serialization and rendering entirely.
+
+    Snapshots follow versions, so without a cache shared by the workers
+    requests go through the regular DRF views instead.
+    """
+
+    snapshot = None
+    authentication_classes = ()
+
+    def snapshot_response(self, body):
+        return HttpResponse(body, content_type='application/json')
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if response.status_code in (200, 304):
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=settings.REFERENCE_DATA_MAX_AGE,
+            )
+        return response
+
+    def get_snapshot_body(self):
+        return self.snapshot.body
+
+    def list(self, request, *args, **kwargs):
+        if not versions_are_shared():
+            return super().list(request, *args, **kwargs)
+        return self.snapshot_response(self.get_snapshot_body())
+
+    def retrieve(self, request, *args, **kwargs):
+        if not versions_are_shared():
+            return super().retrieve(request, *args, **kwargs)
+        return self.snapshot_response(
+            self.snapshot.fragment(kwargs[self.lookup_field])
+        )
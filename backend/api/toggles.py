@@ -0,0 +1,167 @@
+"""Native async versions of the favorite, cart and subscribe toggles.
+
+These endpoints are hit far more often than anything else that writes, and
+a DRF action holds a worker thread across every query. Served by an ASGI
+server, the views below only occupy the event loop between awaits; under
+WSGI they run through async_to_sync like any other async view.
+Authentication reuses the configured DRF classes and every response,
+including the errors, keeps the body the DRF actions they replaced
+produced.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from recipes.models import Favourite, Recipe, ShoppingCart
+from rest_framework import exceptions, status
+from rest_framework.settings import api_settings
+from users.models import Subscribe
+
+from . import links
+from .renderers import ORJSONRenderer
+from .serializers import RecipeShortSerializer
+
+User = get_user_model()
+
+
+def render(data=None, status_code=status.HTTP_200_OK, headers=None):
+    content = b'' if data is None else ORJSONRenderer().render(data)
+    response = HttpResponse(
+        content, status=status_code, content_type='application/json'
+    )
+    for name, value in (headers or {}).items():
+        response[name] = value
+    return response
+
+
+def _authenticate(request):
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        authenticator = authentication_class()
+        result = authenticator.authenticate(request)
+        if result is not None:
+            return result[0]
+    return None
+
+
+def _auth_header():
+    classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    return classes[0]().authenticate_header(None) if classes else None
+
+
+def toggle_view(methods):
+    """Authenticate like IsAuthenticated does before calling the view."""
+
+    def decorator(view):
+        async def wrapper(request, **kwargs):
+            if request.method not in methods:
+                error = exceptions.MethodNotAllowed(request.method)
+                return render(
+                    {'detail': error.detail},
+                    error.status_code,
+                    {'Allow': ', '.join(methods)},
+                )
+            try:
+                user = await sync_to_async(_authenticate)(request)
+                if user is None:
+                    raise exceptions.NotAuthenticated()
+            except exceptions.APIException as error:
+                header = _auth_header()
+                return render(
+                    {'detail': error.detail},
+                    error.status_code,
+                    {'WWW-Authenticate': header} if header else None,
+                )
+            request.user = user
+            return await view(request, **kwargs)
+        return csrf_exempt(wrapper)
+    return decorator
+
+
+def recipe_not_found():
+    return render(
+        {'detail': 'No Recipe matches the given query.'},
+        status.HTTP_404_NOT_FOUND,
+    )
+
+
+async def add_to(model, user, pk):
+    if not pk.isdecimal():
+        return recipe_not_found()
+    pk = int(pk)
+    added = await sync_to_async(links.add)(model, user.pk, [pk])
+    recipe = await Recipe.objects.filter(pk=pk).afirst()
+    if recipe is None:
+        return recipe_not_found()
+    if not added:
+        return render(
+            {'errors': 'Рецепт уже добавлен!'}, status.HTTP_400_BAD_REQUEST
+        )
+    return render(
+        RecipeShortSerializer(recipe).data, status.HTTP_201_CREATED
+    )
+
+
+async def delete_from(model, user, pk):
+    if not pk.isdecimal():
+        return recipe_not_found()
+    if await sync_to_async(links.remove)(model, user.pk, [int(pk)]):
+        return render(status_code=status.HTTP_204_NO_CONTENT)
+    return render(
+        {'errors': 'Рецепт уже удален!'}, status.HTTP_400_BAD_REQUEST
+    )
+
+
+@toggle_view(('POST', 'DELETE'))
+async def favorite(request, pk):
+    if request.method == 'POST':
+        return await add_to(Favourite, request.user, pk)
+    return await delete_from(Favourite, request.user, pk)
+
+
+@toggle_view(('POST', 'DELETE'))
+async def shopping_cart(request, pk):
+    if request.method == 'POST':
+        return await add_to(ShoppingCart, request.user, pk)
+    return await delete_from(ShoppingCart, request.user, pk)
+
+
+@toggle_view(('POST', 'DELETE'))
+async def subscribe(request, id):
+    from users.serializers import SubscribeSerializer
+
+    user = request.user
+    author = await User.objects.filter(pk=id).afirst()
+    if author is None:
+        return render(
+            {'detail': 'No CustomUser matches the given query.'},
+            status.HTTP_404_NOT_FOUND,
+        )
+    if user == author:
+        return render(
+            {'error': 'Нельзя подписаться на самого себя'},
+            status.HTTP_400_BAD_REQUEST,
+        )
+    if request.method == 'DELETE':
+        deleted, _ = await Subscribe.objects.filter(
+            subscriber=user, author=author
+        ).adelete()
+        if deleted:
+            return render(status_code=status.HTTP_204_NO_CONTENT)
+        return render(
+            {'error': 'Вы не подписаны на этого пользователя'},
+            status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        # The unique constraint settles concurrent subscribes: the loser
+        # gets the same answer as a repeated one.
+        await Subscribe.objects.acreate(subscriber=user, author=author)
+    except IntegrityError:
+        return render(
+            {'error': 'Вы уже подписаны на этого пользователя'},
+            status.HTTP_400_BAD_REQUEST,
+        )
+    data = await sync_to_async(
+        lambda: SubscribeSerializer(author, context={'request': request}).data
+    )()
+    return render(data, status.HTTP_201_CREATED)
@@ -1,5 +1,6 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
+from . import toggles
 from .views import IngredientViewSet, RecipeViewSet, TagViewSet
 
 app_name = 'api'
@@ -10,5 +11,7 @@ router.register('ingredients', IngredientViewSet)
 router.register('tags', TagViewSet)
 
 urlpatterns = [
+    path('recipes/<pk>/favorite/', toggles.favorite),
+    path('recipes/<pk>/shopping_cart/', toggles.shopping_cart),
     path('', include(router.urls)),
 ]
@@ -1,37 +1,120 @@
-from datetime import datetime
-from django.db.models import Sum
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
+from django.db.models import Count, F, Max
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from recipes.models import (Favourite, Ingredient, IngredientInRecipe, Recipe,
-                            ShoppingCart, Tag)
-from rest_framework import status
+from recipes.models import (Favourite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingListItem, Tag)
+from recipes.memberships import (CART, FAVORITES, SUBSCRIPTIONS,
+                                 membership_cache)
+from recipes import timeline
+from recipes.search import ingredient_index
+from recipes.versions import get_version, get_versions
 from rest_framework.decorators import action
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.status import HTTP_400_BAD_REQUEST
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
+from . import links
+from .cache import AnonymousListCacheMixin, recipe_list_cache
+from .conditional import (ConditionalGetMixin, make_etag,
+                          user_collections_state)
+from .exports import SHOPPING_LIST_FORMATS
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomPagination
+from .imports import NDJSONParser, import_recipes
+from .pagination import CustomPagination, FeedPagination
 from .permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
-from .serializers import (IngredientSerializer, RecipeReadSerializer,
-                          RecipeShortSerializer, RecipeWriteSerializer,
-                          TagSerializer)
+from .serializers import (IngredientSerializer, RecipeBulkSerializer,
+                          RecipeReadSerializer, RecipeWriteSerializer,
+                          ShoppingListItemSerializer, TagSerializer)
+from .snapshots import ReferenceSnapshot, SnapshotViewMixin
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, SnapshotViewMixin,
+                        ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     permission_classes = (IsAdminOrReadOnly,)
     serializer_class = IngredientSerializer
+    pagination_class = None
     filterset_class = IngredientFilter
     filter_backends = (DjangoFilterBackend,)
+    snapshot = ReferenceSnapshot(
+        'ingredients', Ingredient.objects.all, IngredientSerializer
+    )
+
+    def get_validators(self):
+        version = get_version('ingredients')
+        etag = make_etag('ingredients', version, self.request.get_full_path())
+        return etag, version / 10 ** 6
+
+    def get_snapshot_body(self):
+        name = self.request.query_params.get('name')
+        if not name:
+            return super().get_snapshot_body()
+        return self.snapshot.join(
+            ingredient.id for ingredient in ingredient_index.search(name)
+        )
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, AnonymousListCacheMixin,
+                    ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly | IsAdminOrReadOnly,)
     pagination_class = CustomPagination
     filterset_class = RecipeFilter
     filter_backends = (DjangoFilterBackend,)
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.with_related()
+        return queryset
+
+    def get_validators(self):
+        user = self.request.user
+        if self.action == 'list' and user.is_anonymous:
+            return make_etag(recipe_list_cache.key(self.request)), None
+        queryset = self.filter_queryset(self.get_queryset())
+        versions = get_versions(('tags', 'ingredients', 'authors'))
+        if self.action == 'retrieve':
+            if not str(self.kwargs['pk']).isdigit():
+                return None, None
+            state = queryset.filter(pk=self.kwargs['pk']).prefetch_related(
+                None
+            ).values_list(
+                'modified',
+                'author_id',
+                'author__email',
+                'author__username',
+                'author__first_name',
+                'author__last_name',
+            ).first()
+            if state is None:
+                return None, None
+            memberships = membership_cache.for_request(self.request)
+            flags = (
+                int(self.kwargs['pk']) in memberships[FAVORITES],
+                int(self.kwargs['pk']) in memberships[CART],
+                state[1] in memberships[SUBSCRIPTIONS],
+            )
+            etag = make_etag('recipe', user.pk, versions, state, flags)
+            if user.is_authenticated:
+                return etag, None
+            # Tag, ingredient and author renames show up in the body
+            # without touching the recipe itself.
+            return etag, max(
+                state[0].timestamp(),
+                *(version / 10 ** 6 for version in versions),
+            )
+        stats = queryset.aggregate(count=Count('id'), modified=Max('modified'))
+        if self.request.query_params.get('ordering') == 'popular':
+            versions += (get_version(recipe_list_cache.popularity),)
+        etag = make_etag(
+            'recipes',
+            user.pk,
+            self.request.get_full_path(),
+            versions,
+            tuple(stats.values()),
+            user_collections_state(self.request),
+        )
+        return etag, None
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -41,45 +124,93 @@ class RecipeViewSet(ModelViewSet):
         return RecipeWriteSerializer
 
     @action(
-        detail=True,
+        detail=False,
+        methods=['post'],
+        url_path='import',
         permission_classes=[IsAuthenticated],
-        methods=['post', 'delete']
+        parser_classes=[NDJSONParser],
     )
-    def favorite(self, request, pk):
-        if request.method == 'POST':
-            return self.add_to(Favourite, request.user, pk)
-        return self.delete_from(Favourite, request.user, pk)
+    def bulk_import(self, request):
+        return StreamingHttpResponse(
+            import_recipes(
+                request.data,
+                request.user,
+                self.get_serializer_context(),
+            ),
+            content_type=NDJSONParser.media_type,
+        )
 
     @action(
-        detail=True,
+        detail=False,
+        methods=['post'],
+        url_path='bulk',
         permission_classes=[IsAuthenticated],
-        methods=['post', 'delete']
     )
-    def shopping_cart(self, request, pk):
-        if request.method == 'POST':
-            return self.add_to(ShoppingCart, request.user, pk)
-        return self.delete_from(ShoppingCart, request.user, pk)
+    def bulk(self, request):
+        serializer = RecipeBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        model = Favourite if data['target'] == 'favorite' else ShoppingCart
+        recipe_ids = list(dict.fromkeys(data['recipes']))
+        if data['action'] == 'add':
+            changed = links.add(model, request.user.pk, recipe_ids)
+            results = dict.fromkeys(recipe_ids, 'not_found')
+            rest = set(recipe_ids) - changed
+            if rest:
+                results.update(dict.fromkeys(
+                    Recipe.objects.filter(pk__in=rest).values_list(
+                        'pk', flat=True
+                    ),
+                    'exists',
+                ))
+            results.update(dict.fromkeys(changed, 'added'))
+        else:
+            changed = links.remove(model, request.user.pk, recipe_ids)
+            results = dict.fromkeys(recipe_ids, 'absent')
+            results.update(dict.fromkeys(changed, 'removed'))
+        return Response({
+            'target': data['target'],
+            'action': data['action'],
+            'results': [
+                {'id': recipe_id, 'status': result}
+                for recipe_id, result in results.items()
+            ],
+        })
 
-    def add_to(self, model, user, pk):
-        if model.objects.filter(user=user, recipe__id=pk).exists():
-            return Response(
-                {'errors': 'Рецепт уже добавлен!'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
-        serializer = RecipeShortSerializer(recipe)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-    def delete_from(self, model, user, pk):
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(
-            {'errors': 'Рецепт уже удален!'},
-            status=status.HTTP_400_BAD_REQUEST
+    @action(
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        pagination_class=FeedPagination,
+    )
+    def feed(self, request):
+        paginator = self.paginator
+        recipe_ids = paginator.paginate_ids(
+            lambda before, limit: timeline.feed_ids(
+                request.user, before, limit
+            ),
+            request,
+        )
+        recipes = Recipe.objects.with_related().filter(pk__in=recipe_ids)
+        serializer = self.get_serializer(recipes, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def shopping_list_items(self, user):
+        return ShoppingListItem.objects.filter(
+            user=user, amount__gt=0
+        ).order_by('ingredient__title', 'ingredient__unit')
+
+    @action(
+        detail=False,
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_list(self, request):
+        serializer = ShoppingListItemSerializer(
+            self.shopping_list_items(request.user).select_related(
+                'ingredient'
+            ),
+            many=True,
         )
+        return Response(serializer.data)
 
     @action(
         detail=False,
@@ -87,32 +218,37 @@ class RecipeViewSet(ModelViewSet):
     )
     def download_shopping_cart(self, request):
         user = request.user
-        if not user.shopping_cart.exists():
+        if not user.shopping_recipes.exists():
             return Response(status=HTTP_400_BAD_REQUEST)
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        today = datetime.today()
-        shopping_list = (
-            f'Список покупок для: {user.get_full_name()}\n\n'
-            f'Дата: {today:%Y-%m-%d}\n\n'
+        filetype = request.query_params.get('filetype', 'txt')
+        if filetype not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'errors': 'Неизвестный формат файла!'},
+                status=HTTP_400_BAD_REQUEST
+            )
+        ingredients = self.shopping_list_items(user).values(
+            'amount',
+            name=F('ingredient__title'),
+            measurement_unit=F('ingredient__unit'),
+        )
+        render, content_type = SHOPPING_LIST_FORMATS[filetype]
+        response = StreamingHttpResponse(
+            render(user, ingredients.iterator()),
+            content_type=content_type
         )
-        shopping_list += '\n'.join([
-            f'- {ingredient["ingredient__name"]} '
-            f'({ingredient["ingredient__measurement_unit"]})'
-            f' - {ingredient["amount"]}'
-            for ingredient in ingredients
-        ])
-        shopping_list += f'\n\nFoodgram ({today:%Y})'
-        filename = f'{user.username}_shopping_list.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
+        filename = f'{user.username}_shopping_list.{filetype}'
         response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, SnapshotViewMixin,
+                 ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     permission_classes = (IsAdminOrReadOnly,)
     serializer_class = TagSerializer
+    pagination_class = None
+    snapshot = ReferenceSnapshot('tags', Tag.objects.all, TagSerializer)
+
+    def get_validators(self):
+        version = get_version('tags')
+        etag = make_etag('tags', version, self.request.get_full_path())
+        return etag, version / 10 ** 6
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared(alias):
+    """Whether an entry one worker writes to the alias is seen by the others.
+
+    Local memory is private to a process, so it only counts as shared for
+    the single-process DEBUG server; a dummy cache keeps nothing.
+    """
+    backend = caches[alias]
+    if isinstance(backend, DummyCache):
+        return False
+    return settings.DEBUG or not isinstance(backend, LocMemCache)
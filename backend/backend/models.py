@@ -0,0 +1,23 @@
+class DerivedColumnsMixin:
+    """Leaves columns maintained by queryset updates out of regular saves.
+
+    ``derived_columns`` are written when the row is inserted and afterwards
+    only through ``update()`` with F() expressions. Saving an instance
+    loaded earlier would otherwise write their old values back over every
+    update made since. Explicit ``update_fields`` are left alone.
+    """
+
+    derived_columns = ()
+
+    def save(self, *args, **kwargs):
+        if (not args and not self._state.adding
+                and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.derived_columns
+                and field.attname not in deferred
+            ]
+        return super().save(*args, **kwargs)
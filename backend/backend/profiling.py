@@ -0,0 +1,268 @@
+"""Per-request timings in a Server-Timing header, plus profiler dumps.
+
+Every request gets its SQL query count and time, the time spent in DRF
+serializers and the total time reported as ``Server-Timing``. A random
+sample of requests (``PROFILING_SAMPLE_RATE``) runs under cProfile; with
+``PROFILING_SLOW_REQUEST_MS`` set, a background thread also samples the
+stacks of running requests and keeps them for the ones that turn out
+slow. Either way the profile lands in ``PROFILING_DUMP_DIR`` next to the
+normalized SQL the request ran. Nothing is collected unless
+``PROFILING_ENABLED`` is set to ``True``.
+
+Under ASGI the middleware stays async so async views are not pushed onto
+threads. cProfile then only sees the event loop thread, and the stack
+sampler is not used.
+"""
+import cProfile
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('profiling_request', default=None)
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def normalize_sql(sql):
+    return IN_LIST_RE.sub('IN (...)', ' '.join(sql.split()))
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = Counter()
+        self.query_time = Counter()
+        self.serialize = 0.0
+        self.serializer_depth = 0
+        self.stacks = None
+
+    @property
+    def db_time(self):
+        return sum(self.query_time.values())
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            normalized = normalize_sql(sql)
+            self.queries[normalized] += 1
+            self.query_time[normalized] += time.perf_counter() - started
+
+
+def record_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings.record_query(execute, sql, params, many, context)
+
+
+def instrument_connection(connection, **kwargs):
+    """Install record_query once on a connection.
+
+    Connections are per thread, and async views reach the database from
+    sync_to_async threads, so the wrapper stays installed and looks the
+    request up in the context variable instead.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _timed_data(data):
+    """Wrap BaseSerializer.data so only the outermost call is timed."""
+
+    def getter(serializer):
+        timings = _current.get()
+        if timings is None:
+            return data.fget(serializer)
+        timings.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return data.fget(serializer)
+        finally:
+            timings.serializer_depth -= 1
+            if not timings.serializer_depth:
+                timings.serialize += time.perf_counter() - started
+    getter._profiling = True
+    return property(getter)
+
+
+def instrument_serializers():
+    from rest_framework.serializers import BaseSerializer, ListSerializer
+
+    for cls in (BaseSerializer, ListSerializer):
+        data = cls.__dict__.get('data')
+        if data is not None and not getattr(data.fget, '_profiling', False):
+            cls.data = _timed_data(data)
+
+
+class StackSampler(threading.Thread):
+    """Collects folded stacks of the threads serving requests."""
+
+    def __init__(self, interval):
+        super().__init__(name='profiling-sampler', daemon=True)
+        self.interval = interval
+        self.requests = {}
+
+    def watch(self, timings):
+        timings.stacks = Counter()
+        self.requests[threading.get_ident()] = timings
+
+    def forget(self):
+        self.requests.pop(threading.get_ident(), None)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            for ident, timings in list(self.requests.items()):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f'{code.co_name} ({code.co_filename}:{frame.f_lineno})'
+                    )
+                    frame = frame.f_back
+                if stack:
+                    timings.stacks[';'.join(reversed(stack))] += 1
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.slow_ms = settings.PROFILING_SLOW_REQUEST_MS
+        self.dump_dir = Path(settings.PROFILING_DUMP_DIR)
+        self.sampler = None
+        if self.slow_ms:
+            self.sampler = StackSampler(settings.PROFILING_SAMPLE_INTERVAL)
+            self.sampler.start()
+        self.async_profiling = False
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        instrument_serializers()
+        connection_created.connect(instrument_connection)
+
+    def sampled(self):
+        return bool(self.sample_rate) and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        profiler = None
+        if self.sampled():
+            profiler = cProfile.Profile()
+        elif self.sampler is not None:
+            self.sampler.watch(timings)
+        try:
+            for connection in connections.all():
+                instrument_connection(connection)
+            if profiler is not None:
+                response = profiler.runcall(self.get_response, request)
+            else:
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+            if self.sampler is not None:
+                self.sampler.forget()
+        return self.finish(request, response, timings, profiler)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        profiler = None
+        # One event loop serves many requests at once; only one of them
+        # can own the thread's profiler.
+        if not self.async_profiling and self.sampled():
+            profiler = cProfile.Profile()
+            self.async_profiling = True
+            profiler.enable()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+            if profiler is not None:
+                profiler.disable()
+                self.async_profiling = False
+        return self.finish(request, response, timings, profiler)
+
+    def finish(self, request, response, timings, profiler):
+        total = time.perf_counter() - timings.started
+        response['Server-Timing'] = self.server_timing(timings, total)
+
+        slow = self.slow_ms and total * 1000 >= self.slow_ms
+        if profiler is not None or (slow and timings.stacks):
+            try:
+                self.dump(request, response, timings, total, profiler)
+            except OSError:
+                logger.exception('Не удалось сохранить профиль запроса')
+        return response
+
+    def server_timing(self, timings, total):
+        return ', '.join((
+            f'db;dur={timings.db_time * 1000:.1f};'
+            f'desc="{sum(timings.queries.values())} queries"',
+            f'serialize;dur={timings.serialize * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+
+    def dump(self, request, response, timings, total, profiler):
+        self.dump_dir.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r'[^\w]+', '-', request.path).strip('-') or 'root'
+        prefix = self.dump_dir / (
+            f'{datetime.now():%Y%m%d-%H%M%S-%f}-{request.method}-'
+            f'{slug[:80]}-{total * 1000:.0f}ms'
+        )
+        if profiler is not None:
+            profiler.dump_stats(f'{prefix}.prof')
+        else:
+            Path(f'{prefix}.folded').write_text(
+                ''.join(
+                    f'{stack} {count}\n'
+                    for stack, count in timings.stacks.most_common()
+                ),
+                encoding='utf-8',
+            )
+        report = {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 3),
+            'db_ms': round(timings.db_time * 1000, 3),
+            'serialize_ms': round(timings.serialize * 1000, 3),
+            'queries': [
+                {
+                    'sql': sql,
+                    'count': count,
+                    'total_ms': round(timings.query_time[sql] * 1000, 3),
+                }
+                for sql, count in timings.queries.most_common()
+            ],
+        }
+        Path(f'{prefix}.sql.json').write_text(
+            json.dumps(report, ensure_ascii=False, indent=2),
+            encoding='utf-8',
+        )
@@ -0,0 +1,163 @@
+"""Read replicas for safe requests, with reads pinned after writes.
+
+``DATABASE_REPLICAS`` lists the aliases that replicate ``default``. For
+GET, HEAD and OPTIONS requests ``ReplicaMiddleware`` lets
+``ReplicaRouter`` send ORM reads to one replica per request once the
+requesting user is known. A user whose request changed something less
+than ``DATABASE_REPLICA_PIN_SECONDS`` ago keeps reading from the primary,
+so their own favorites, carts and subscriptions are never stale. Pins
+live in the default cache, which therefore has to be shared by all
+workers; local memory is only accepted for the DEBUG server. Writes,
+unsafe requests, token lookups, management commands, background threads
+and raw SQL on ``connection`` stay on the primary, as does anything
+wrapped in ``primary()``.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.functional import LazyObject, empty
+
+from .caches import is_shared
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Read right after being written by another request: login creates the
+# token the next request authenticates with.
+PRIMARY_MODELS = {'authtoken.token'}
+
+_reads = ContextVar('replica_reads', default=None)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def pin_key(user_id):
+    return f'db:primary:{user_id}'
+
+
+def pin(user_id):
+    """Keep the user's reads on the primary while replicas catch up."""
+    cache.set(pin_key(user_id), True, settings.DATABASE_REPLICA_PIN_SECONDS)
+
+
+@contextmanager
+def primary():
+    """Read from the primary, e.g. to fill a cache shared with others."""
+    token = _reads.set(False)
+    try:
+        yield
+    finally:
+        _reads.reset(token)
+
+
+def _resolved_user(request):
+    # AuthenticationMiddleware leaves a lazy session user until something
+    # touches it, and DRF replaces it once the token is checked. Resolving
+    # it here would query the primary from inside the router.
+    user = getattr(request, 'user', None)
+    if isinstance(user, LazyObject) and user._wrapped is empty:
+        return None
+    return user
+
+
+class ReadState:
+    def __init__(self, request):
+        self.request = request
+        self.replica = random.choice(replicas())
+        self.alias = None
+
+    def read_alias(self):
+        if self.alias is not None:
+            return self.alias
+        user = _resolved_user(self.request)
+        if user is None:
+            return DEFAULT_DB_ALIAS
+        if not user.is_authenticated:
+            return self.replica
+        self.alias = (
+            DEFAULT_DB_ALIAS if cache.get(pin_key(user.pk)) else self.replica
+        )
+        return self.alias
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _reads.get()
+        if not state or model._meta.label_lower in PRIMARY_MODELS:
+            return DEFAULT_DB_ALIAS
+        return state.read_alias()
+
+    def db_for_write(self, model, **hints):
+        # Instances read from a replica would otherwise be saved back to it.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in replicas():
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replicas():
+            raise MiddlewareNotUsed
+        if not is_shared(DEFAULT_CACHE_ALIAS):
+            raise ImproperlyConfigured(
+                'Для DATABASE_REPLICAS нужен общий кэш (REDIS_URL): иначе '
+                'запрос, попавший в другой процесс, не увидит свежих '
+                'изменений пользователя.'
+            )
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def pin_writer(self, user, response):
+        if (user is not None and user.is_authenticated
+                and response.status_code < 400):
+            pin(user.pk)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            self.pin_writer(getattr(request, 'user', None), response)
+            return response
+        if _reads.get() is not None:
+            return self.get_response(request)
+        token = _reads.set(ReadState(request))
+        try:
+            return self.get_response(request)
+        finally:
+            _reads.reset(token)
+
+    async def __acall__(self, request):
+        if request.method not in SAFE_METHODS:
+            response = await self.get_response(request)
+            user = _resolved_user(request)
+            if user is None and hasattr(request, 'auser'):
+                user = await request.auser()
+            self.pin_writer(user, response)
+            return response
+        if _reads.get() is not None:
+            return await self.get_response(request)
+        token = _reads.set(ReadState(request))
+        try:
+            return await self.get_response(request)
+        finally:
+            _reads.reset(token)
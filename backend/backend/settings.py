@@ -35,11 +35,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'backend.replicas.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -67,15 +69,72 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
         'NAME': os.getenv('POSTGRES_DB', 'foodgram'),
         'USER': os.getenv('POSTGRES_USER', 'foodgram_user'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'foodgram_password'),
-         'HOST': os.getenv('DB_HOST', 'db-1'),
-         'PORT': os.getenv('DB_PORT', 5432)
+        'HOST': os.getenv('DB_HOST', 'db-1'),
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas of the primary as DB_REPLICA_HOSTS=host[:port],...
+# With DB_ENGINE=django.db.backends.sqlite3 every alias opens the same
+# file, which is enough to try the routing locally.
+DATABASE_REPLICAS = []
+for index, address in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))
+):
+    host, _, port = address.strip().partition(':')
+    alias = f'replica_{index + 1}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['backend.replicas.ReplicaRouter']
+DATABASE_REPLICA_PIN_SECONDS = int(
+    os.getenv('DATABASE_REPLICA_PIN_SECONDS', 10)
+)
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        alias: {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+            'KEY_PREFIX': alias,
+        }
+        for alias in ('default', 'memberships', 'tokens')
+    }
+else:
+    # Local memory is private to a worker process, so entries other
+    # workers invalidate are only kept by the single-process development
+    # server.
+    user_cache_backend = (
+        'django.core.cache.backends.locmem.LocMemCache' if DEBUG
+        else 'django.core.cache.backends.dummy.DummyCache'
+    )
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'memberships': {
+            'BACKEND': user_cache_backend,
+            'LOCATION': 'memberships',
+            'OPTIONS': {'MAX_ENTRIES': 30000},
+        },
+        'tokens': {
+            'BACKEND': user_cache_backend,
+            'LOCATION': 'tokens',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+    }
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -107,7 +166,12 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
 
     'DEFAULT_PERMISSION_CLASSES': [
@@ -118,3 +182,26 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10,
 
 }
+
+SHOPPING_LIST_FONT = os.getenv(
+    'SHOPPING_LIST_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+REFERENCE_DATA_MAX_AGE = int(os.getenv('REFERENCE_DATA_MAX_AGE', 60 * 60))
+
+RECIPE_IMPORT_BATCH_SIZE = int(os.getenv('RECIPE_IMPORT_BATCH_SIZE', 200))
+
+RECIPE_BULK_MAX_SIZE = int(os.getenv('RECIPE_BULK_MAX_SIZE', 100))
+
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 10000))
+
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 5 * 60))
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+PROFILING_SLOW_REQUEST_MS = float(os.getenv('PROFILING_SLOW_REQUEST_MS', 0))
+PROFILING_SAMPLE_INTERVAL = float(
+    os.getenv('PROFILING_SAMPLE_INTERVAL', 0.005)
+)
+PROFILING_DUMP_DIR = os.getenv('PROFILING_DUMP_DIR', BASE_DIR / 'profiles')
@@ -23,9 +23,9 @@ class RecipeAdmin(admin.ModelAdmin):
     readonly_fields = ('added_in_favorites',)
     list_filter = ('author', 'name', 'tags',)
 
-    @display(description='Количество в избранных')
+    @display(description='Количество в избранных', ordering='favorites_count')
     def added_in_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
 
 @admin.register(Tag)
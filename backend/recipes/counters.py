@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from users.models import Subscribe
+
+from .models import Favourite, Recipe, ShoppingCart
+
+User = get_user_model()
+
+# Counter column -> (model holding it, related rows, their foreign key).
+COUNTERS = {
+    'favorites_count': (Recipe, Favourite, 'recipe'),
+    'shopping_cart_count': (Recipe, ShoppingCart, 'recipe'),
+    'recipes_count': (User, Recipe, 'author'),
+    'subscribers_count': (User, Subscribe, 'author'),
+}
+
+
+def shift(field, pk, delta):
+    """Atomically move a counter column by delta, never below zero."""
+    if pk is None or not delta:
+        return
+    model = COUNTERS[field][0]
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def refresh_tag_masks(recipe_ids=None, batch_size=1000):
+    """Recompute Recipe.tag_mask from the tag links of the given recipes."""
+    links = Recipe.tags.through.objects.all()
+    if recipe_ids is None:
+        masks = dict.fromkeys(
+            Recipe.objects.values_list('pk', flat=True), 0
+        )
+    else:
+        masks = dict.fromkeys(recipe_ids, 0)
+        links = links.filter(recipe_id__in=masks)
+    for recipe_id, bit in links.values_list('recipe_id', 'tag__bit'):
+        masks[recipe_id] |= 1 << bit
+    Recipe.objects.bulk_update(
+        [Recipe(pk=pk, tag_mask=mask) for pk, mask in masks.items()],
+        ['tag_mask'],
+        batch_size=batch_size,
+    )
+    return len(masks)
+
+
+def recount(field):
+    """Recompute a counter column for every row in a single UPDATE."""
+    model, related, foreign_key = COUNTERS[field]
+    counts = related.objects.filter(
+        **{foreign_key: OuterRef('pk')}
+    ).order_by().values(foreign_key).annotate(
+        total=Count('pk')
+    ).values('total')
+    return model.objects.update(**{
+        field: Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+    })
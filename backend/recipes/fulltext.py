@@ -0,0 +1,169 @@
+"""Full-text search over recipe titles and descriptions.
+
+The index lives in a side table keyed by recipe id, created after
+``migrate`` by the backend matching the database vendor: a ``tsvector``
+column with a GIN index on PostgreSQL, an FTS5 virtual table on SQLite.
+Titles weigh more than descriptions in the ranking.
+"""
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .stemming import WORD_RE, stem, stem_text
+
+TABLE = 'recipes_recipe_search'
+
+
+class PostgresBackend:
+    install_sql = (
+        f'CREATE TABLE IF NOT EXISTS {TABLE} ('
+        ' recipe_id bigint PRIMARY KEY'
+        ' REFERENCES recipes_recipe (id) ON DELETE CASCADE,'
+        ' document tsvector NOT NULL)',
+        f'CREATE INDEX IF NOT EXISTS {TABLE}_document'
+        f' ON {TABLE} USING gin (document)',
+    )
+    query = "websearch_to_tsquery('russian', %s)"
+
+    def index(self, cursor, recipe_ids):
+        cursor.execute(
+            f'INSERT INTO {TABLE} (recipe_id, document)'
+            " SELECT id, setweight(to_tsvector('russian', title), 'A')"
+            " || setweight(to_tsvector('russian', description), 'B')"
+            ' FROM recipes_recipe WHERE id = ANY(%s)'
+            ' ON CONFLICT (recipe_id)'
+            ' DO UPDATE SET document = EXCLUDED.document',
+            [list(recipe_ids)],
+        )
+
+    def remove(self, cursor, recipe_ids):
+        # Rows go away with the recipe through ON DELETE CASCADE.
+        pass
+
+    def prepare(self, text):
+        return text
+
+    def matches_sql(self):
+        return (
+            f'SELECT recipe_id FROM {TABLE}'
+            f' WHERE document @@ {self.query}'
+        )
+
+    def rank_sql(self):
+        return (
+            f'SELECT ts_rank(document, {self.query}) FROM {TABLE}'
+            f' WHERE recipe_id = recipes_recipe.id'
+        )
+
+
+class SQLiteBackend:
+    install_sql = (
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5('
+        "title, description, tokenize = 'unicode61 remove_diacritics 2')",
+    )
+
+    def index(self, cursor, recipe_ids):
+        from .models import Recipe
+
+        self.remove(cursor, recipe_ids)
+        rows = Recipe.objects.filter(pk__in=recipe_ids).values_list(
+            'pk', 'title', 'description'
+        )
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, title, description)'
+            ' VALUES (%s, %s, %s)',
+            [
+                (pk, stem_text(title), stem_text(description))
+                for pk, title, description in rows
+            ],
+        )
+
+    def remove(self, cursor, recipe_ids):
+        recipe_ids = list(recipe_ids)
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid IN'
+            f' ({", ".join(["%s"] * len(recipe_ids))})',
+            recipe_ids,
+        )
+
+    def prepare(self, text):
+        # Stems are matched as prefixes, quoted so user input cannot
+        # inject FTS5 query syntax.
+        return ' '.join(
+            '"{}"*'.format(stem(word)) for word in WORD_RE.findall(text)
+        )
+
+    def matches_sql(self):
+        return f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s'
+
+    def rank_sql(self):
+        return (
+            f'SELECT -bm25({TABLE}, 2.0, 1.0) FROM {TABLE}'
+            f' WHERE {TABLE} MATCH %s AND rowid = recipes_recipe.id'
+        )
+
+
+BACKENDS = {
+    'postgresql': PostgresBackend,
+    'sqlite': SQLiteBackend,
+}
+
+
+def get_backend():
+    backend = BACKENDS.get(connection.vendor)
+    return backend() if backend else None
+
+
+def install():
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        for statement in backend.install_sql:
+            cursor.execute(statement)
+
+
+def index_recipes(recipe_ids):
+    backend = get_backend()
+    if backend is not None and recipe_ids:
+        with connection.cursor() as cursor:
+            backend.index(cursor, recipe_ids)
+
+
+def remove_recipes(recipe_ids):
+    backend = get_backend()
+    if backend is not None and recipe_ids:
+        with connection.cursor() as cursor:
+            backend.remove(cursor, recipe_ids)
+
+
+def rebuild(batch_size=1000):
+    from .models import Recipe
+
+    install()
+    ids = list(Recipe.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        index_recipes(ids[start:start + batch_size])
+    return len(ids)
+
+
+def search(queryset, text):
+    """Filter a recipe queryset by text and annotate it with search_rank.
+
+    Databases without a backend fall back to a plain icontains match.
+    """
+    backend = get_backend()
+    if backend is None:
+        return queryset.filter(
+            Q(title__icontains=text) | Q(description__icontains=text)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+    query = backend.prepare(text)
+    if not query:
+        return queryset.none()
+    return queryset.filter(
+        pk__in=RawSQL(backend.matches_sql(), [query])
+    ).annotate(
+        search_rank=RawSQL(
+            backend.rank_sql(), [query], output_field=FloatField()
+        )
+    )
@@ -0,0 +1,116 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = {
+    'thumbnail': (320, 320),
+    'card': (640, 480),
+}
+FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+# Sent with the recipe once its variants are stored; the update bypasses
+# post_save.
+variants_ready = Signal()
+
+_executor = ThreadPoolExecutor(
+    max_workers=2, thread_name_prefix='image-variants'
+)
+
+
+class DeduplicatingStorage(FileSystemStorage):
+    """Storage for content-addressed names: an existing name is reused."""
+
+    def save(self, name, content, max_length=None):
+        if name and self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+def recipe_image_path(instance, filename):
+    digest = hashlib.sha256()
+    content = instance.image.file
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    extension = os.path.splitext(filename)[1].lower()
+    name = digest.hexdigest()
+    return f'recipes/{name[:2]}/{name}{extension}'
+
+
+def variant_name(name, variant, image_format):
+    base = os.path.splitext(name)[0]
+    return f'{base}_{variant}.{FORMATS[image_format][1]}'
+
+
+def render_variant(source, size, image_format):
+    image = ImageOps.fit(source, size, Image.LANCZOS)
+    if image_format == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, FORMATS[image_format][0], quality=80)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_variants(recipe_id):
+    from .models import Recipe
+
+    try:
+        recipe = Recipe.objects.filter(pk=recipe_id).only(
+            'image', 'author_id'
+        ).first()
+        if recipe is None or not recipe.image:
+            return
+        storage = recipe.image.storage
+        with recipe.image.open('rb') as file:
+            source = ImageOps.exif_transpose(Image.open(file))
+            source.load()
+        variants = {}
+        for variant, size in VARIANTS.items():
+            variants[variant] = {}
+            for image_format in FORMATS:
+                name = variant_name(recipe.image.name, variant, image_format)
+                if not storage.exists(name):
+                    storage.save(
+                        name, render_variant(source, size, image_format)
+                    )
+                variants[variant][image_format] = name
+        updated = Recipe.objects.filter(
+            pk=recipe_id, image=recipe.image.name
+        ).update(image_variants=variants, modified=timezone.now())
+        if updated:
+            variants_ready.send(sender=Recipe, instance=recipe)
+    except Exception:
+        logger.exception('Не удалось подготовить изображения рецепта %s',
+                         recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_variants(recipe_id):
+    if getattr(settings, 'IMAGE_VARIANTS_ASYNC', True):
+        transaction.on_commit(
+            lambda: _executor.submit(generate_variants, recipe_id)
+        )
+    else:
+        transaction.on_commit(lambda: generate_variants(recipe_id))
+
+
+def variants_are_current(recipe):
+    expected = variant_name(recipe.image.name, 'thumbnail', 'webp')
+    current = (recipe.image_variants or {}).get('thumbnail', {})
+    return current.get('webp') == expected
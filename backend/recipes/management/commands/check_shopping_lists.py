@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import shopping_list
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет накопленные итоги списков покупок со свежей агрегацией '
+        'корзин и перестраивает разошедшиеся.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Перестроить итоги пользователей с расхождениями.'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше 0.')
+        drifted = shopping_list.find_drift(options['batch_size'])
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+            return
+        self.stdout.write(
+            f'Расхождения у пользователей ({len(drifted)}): '
+            + ', '.join(map(str, drifted[:50]))
+            + (' ...' if len(drifted) > 50 else '')
+        )
+        if not options['fix']:
+            raise CommandError('Запустите с --fix, чтобы перестроить итоги.')
+        written = shopping_list.rebuild(drifted)
+        self.stdout.write(self.style.SUCCESS(
+            f'Итоги перестроены, позиций: {written}'
+        ))
@@ -0,0 +1,223 @@
+import random
+import time
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from recipes import fulltext, shopping_list, timeline
+from recipes.counters import COUNTERS, recount
+from recipes.images import generate_variants, recipe_image_path
+from recipes.models import (Favourite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, Tag)
+from users.models import Subscribe
+
+User = get_user_model()
+
+PREFIX = 'dataset'
+PASSWORD = 'dataset-password'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F5C518', 'dessert'),
+    ('Выпечка', '#C1440E', 'baking'),
+    ('Суп', '#2D9CDB', 'soup'),
+)
+WORDS = (
+    'картофель', 'курица', 'говядина', 'рис', 'гречка', 'сыр', 'томаты',
+    'грибы', 'лук', 'морковь', 'яблоки', 'творог', 'тесто', 'шоколад',
+    'сметана', 'укроп', 'чеснок', 'рыба', 'капуста', 'тыква', 'ягоды',
+)
+DISHES = (
+    'Запечённый', 'Жареный', 'Тушёный', 'Домашний', 'Быстрый', 'Пирог',
+    'Салат', 'Суп', 'Рагу', 'Запеканка', 'Паста', 'Омлет',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт синтетический набор данных для нагрузочных замеров: '
+        'пользователей, рецепты, избранное, корзины и подписки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes-per-user', type=int, default=10)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--cart-per-user', type=int, default=5)
+        parser.add_argument('--subscriptions-per-user', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить ранее созданный набор перед генерацией.'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--users и --batch-size должны быть больше 0.')
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+        if options['clear']:
+            # Recipes outlive their author (SET_NULL), so remove them first.
+            deleted = 0
+            for queryset in (
+                Recipe.objects.filter(
+                    author__username__startswith=f'{PREFIX}_'
+                ),
+                User.objects.filter(username__startswith=f'{PREFIX}_'),
+            ):
+                deleted += queryset.delete()[0]
+            self.stdout.write(f'Удалено объектов: {deleted}')
+
+        tags = self.ensure_tags()
+        ingredients = self.ensure_ingredients()
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            recipes = self.create_recipes(
+                users, tags, ingredients, options
+            )
+            self.create_links(users, recipes, options)
+            for field in COUNTERS:
+                recount(field)
+            timeline.rebuild()
+            shopping_list.rebuild()
+        if recipes:
+            # Every generated recipe shares one image, so its variants are
+            # rendered once and copied over.
+            generate_variants(recipes[0].pk)
+            Recipe.objects.filter(image=recipes[0].image.name).update(
+                image_variants=Recipe.objects.get(
+                    pk=recipes[0].pk
+                ).image_variants
+            )
+        self.stdout.write('Строится полнотекстовый индекс...')
+        fulltext.rebuild()
+        for alias in ('default', 'memberships'):
+            caches[alias].clear()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {elapsed:.1f} с: пользователей {len(users)}, '
+            f'рецептов {len(recipes)}.'
+        ))
+
+    def bulk_create(self, model, objects):
+        return model.objects.bulk_create(
+            objects, batch_size=self.batch_size
+        )
+
+    def ensure_tags(self):
+        for name, color, slug in TAGS:
+            if not Tag.objects.filter(slug=slug).exists():
+                Tag.objects.create(name=name, color=color, slug=slug)
+        return list(Tag.objects.all())
+
+    def ensure_ingredients(self):
+        ingredients = list(Ingredient.objects.values_list('pk', flat=True))
+        if ingredients:
+            return ingredients
+        self.bulk_create(Ingredient, [
+            Ingredient(title=f'{word} {number}', unit='г')
+            for word in WORDS for number in range(1, 25)
+        ])
+        return list(Ingredient.objects.values_list('pk', flat=True))
+
+    def create_users(self, count):
+        start = User.objects.filter(
+            username__startswith=f'{PREFIX}_'
+        ).count()
+        password = make_password(PASSWORD)
+        self.bulk_create(User, [
+            User(
+                username=f'{PREFIX}_{number}',
+                email=f'{PREFIX}_{number}@example.com',
+                first_name=f'Имя{number}',
+                last_name=f'Фамилия{number}',
+                password=password,
+            )
+            for number in range(start, start + count)
+        ])
+        return list(User.objects.filter(
+            username__startswith=f'{PREFIX}_'
+        ).order_by('-pk')[:count])
+
+    def placeholder_image(self):
+        buffer = BytesIO()
+        Image.new('RGB', (1280, 960), (222, 184, 135)).save(buffer, 'JPEG')
+        recipe = Recipe()
+        recipe.image = ContentFile(buffer.getvalue(), name='placeholder.jpg')
+        name = recipe_image_path(recipe, 'placeholder.jpg')
+        return recipe.image.storage.save(name, recipe.image.file)
+
+    def create_recipes(self, users, tags, ingredients, options):
+        image = self.placeholder_image()
+        choice, sample = self.random.choice, self.random.sample
+        recipes, tag_sets = [], []
+        for user in users:
+            for _ in range(options['recipes_per_user']):
+                recipe_tags = sample(tags, self.random.randint(1, 3))
+                words = sample(WORDS, 6)
+                recipes.append(Recipe(
+                    author=user,
+                    title=f'{choice(DISHES)} {words[0]} и {words[1]}',
+                    description=(
+                        f'Берём {words[2]}, {words[3]} и {words[4]}, '
+                        f'добавляем {words[5]} и готовим до готовности.'
+                    ),
+                    image=image,
+                    cooking_time=self.random.randint(5, 180),
+                    tag_mask=sum(tag.mask for tag in recipe_tags),
+                ))
+                tag_sets.append(recipe_tags)
+        recipes = self.bulk_create(Recipe, recipes)
+        self.bulk_create(Recipe.tags.through, [
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag.pk)
+            for recipe, recipe_tags in zip(recipes, tag_sets)
+            for tag in recipe_tags
+        ])
+        per_recipe = min(options['ingredients_per_recipe'], len(ingredients))
+        self.bulk_create(IngredientInRecipe, [
+            IngredientInRecipe(
+                recipe_id=recipe.pk,
+                ingredient_id=ingredient_id,
+                amount=self.random.randint(1, 500),
+            )
+            for recipe in recipes
+            for ingredient_id in sample(ingredients, per_recipe)
+        ])
+        return recipes
+
+    def create_links(self, users, recipes, options):
+        recipe_ids = [recipe.pk for recipe in recipes]
+        user_ids = [user.pk for user in users]
+
+        def pick(population, count, exclude=None):
+            picked = self.random.sample(
+                population, min(count + 1, len(population))
+            )
+            return [item for item in picked if item != exclude][:count]
+
+        for model, option in (
+            (Favourite, 'favorites_per_user'),
+            (ShoppingCart, 'cart_per_user'),
+        ):
+            self.bulk_create(model, [
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in pick(recipe_ids, options[option])
+            ])
+        self.bulk_create(Subscribe, [
+            Subscribe(subscriber_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in pick(
+                user_ids, options['subscriptions_per_user'], exclude=user_id
+            )
+        ])
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import generate_variants, variants_are_current
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии изображений для рецептов без них.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').only(
+            'id', 'image', 'image_variants'
+        )
+        processed = 0
+        for recipe in recipes.iterator():
+            if options['all'] or not variants_are_current(recipe):
+                generate_variants(recipe.id)
+                processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {processed}'
+        ))
@@ -0,0 +1,123 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import Ingredient
+from recipes.search import ingredient_index
+
+DEFAULT_PATH = settings.BASE_DIR.parent / 'data' / 'ingredients.csv'
+MAX_LENGTH = Ingredient._meta.get_field('title').max_length
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row
+
+
+def read_json(file, chunk_size=64 * 1024):
+    """Yield the items of a top-level JSON array without loading it whole."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        chunk = file.read(chunk_size)
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started:
+                if position == len(buffer):
+                    break
+                if buffer[position] != '[':
+                    raise CommandError('Ожидается JSON-массив.')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise CommandError('Файл JSON обрезан или повреждён.')
+                break
+            yield [item.get('name'), item.get('measurement_unit')]
+        buffer = buffer[position:]
+        if not chunk:
+            return
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты из CSV или JSON пачками. '
+        'Повторный запуск не создаёт дубликатов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=str(DEFAULT_PATH))
+        parser.add_argument('--format', choices=READERS, default=None)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def clean(self, line, row):
+        if len(row) != 2:
+            raise CommandError(f'Строка {line}: ожидается два поля.')
+        title, unit = (str(value or '').strip() for value in row)
+        if not title or not unit:
+            raise CommandError(f'Строка {line}: пустое название или единица.')
+        if len(title) > MAX_LENGTH or len(unit) > MAX_LENGTH:
+            raise CommandError(f'Строка {line}: значение длиннее {MAX_LENGTH}.')
+        return title, unit
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.is_file():
+            raise CommandError(f'Файл {path} не найден.')
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат: {file_format}.')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть положительным.')
+
+        started = time.monotonic()
+        before = Ingredient.objects.count()
+        processed = 0
+        with path.open(encoding='utf-8') as file:
+            rows = enumerate(READERS[file_format](file), 1)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                objects = {}
+                for line, row in batch:
+                    title, unit = self.clean(line, row)
+                    objects[title, unit] = Ingredient(title=title, unit=unit)
+                with transaction.atomic():
+                    Ingredient.objects.bulk_create(
+                        objects.values(), ignore_conflicts=True
+                    )
+                processed += len(batch)
+                self.stdout.write(f'Обработано строк: {processed}')
+        created = Ingredient.objects.count() - before
+        if created:
+            ingredient_index.invalidate()
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else processed
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {processed} строк, добавлено {created}, '
+            f'{elapsed:.2f} с ({rate:.0f} строк/с).'
+        ))
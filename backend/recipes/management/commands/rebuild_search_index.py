@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from recipes import fulltext
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        indexed = fulltext.rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано рецептов: {indexed}'
+        ))
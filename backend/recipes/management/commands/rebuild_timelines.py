@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from recipes import timeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает ленты подписок: заново раскладывает рецепты авторов '
+        'по лентам их подписчиков.'
+    )
+
+    def handle(self, *args, **options):
+        written = timeline.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {written}'
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.counters import COUNTERS, recount, refresh_tag_masks
+
+FIELDS = [*COUNTERS, 'tag_mask']
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики избранного, корзин, рецептов и подписчиков '
+        'и маски тегов рецептов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'fields', nargs='*', help=', '.join(sorted(FIELDS))
+        )
+
+    def handle(self, *args, **options):
+        fields = options['fields'] or FIELDS
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные счётчики: {", ".join(sorted(unknown))}'
+            )
+        for field in fields:
+            with transaction.atomic():
+                if field == 'tag_mask':
+                    updated = refresh_tag_masks()
+                else:
+                    updated = recount(field)
+            self.stdout.write(self.style.SUCCESS(
+                f'{field}: обновлено строк {updated}'
+            ))
@@ -0,0 +1,143 @@
+import time
+
+from backend.replicas import primary
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.db import transaction
+
+FAVORITES = 'favorites'
+CART = 'cart'
+SUBSCRIPTIONS = 'subscriptions'
+
+
+def _sources():
+    from users.models import Subscribe
+
+    from .models import Favourite, ShoppingCart
+
+    return {
+        FAVORITES: (Favourite, 'user_id', 'recipe_id'),
+        CART: (ShoppingCart, 'user_id', 'recipe_id'),
+        SUBSCRIPTIONS: (Subscribe, 'subscriber_id', 'author_id'),
+    }
+
+
+class MembershipCache:
+    """Per-user id sets of favorited recipes, carted recipes and authors.
+
+    Sets live in the ``memberships`` cache alias, which bounds their number
+    (MAX_ENTRIES locally, the eviction policy of the shared backend in
+    production). Each set is stored under a per-user version that writes
+    increment after the transaction commits, so a set loaded before the
+    commit is never read again; without a backend the alias is a dummy
+    cache and every request loads the sets. Hits and misses are counted in
+    the same cache for monitoring.
+    """
+
+    alias = 'memberships'
+    timeout = 60 * 60
+    kinds = (FAVORITES, CART, SUBSCRIPTIONS)
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def enabled(self):
+        return not isinstance(self.cache, DummyCache)
+
+    def version_key(self, user_id, kind):
+        return f'membership:version:{kind}:{user_id}'
+
+    def key(self, user_id, kind, version):
+        return f'membership:{kind}:{user_id}:{version}'
+
+    def _count(self, name, delta):
+        if not delta:
+            return
+        key = f'membership:stats:{name}'
+        self.cache.add(key, 0, None)
+        try:
+            self.cache.incr(key, delta)
+        except ValueError:
+            self.cache.set(key, delta, None)
+
+    def stats(self):
+        values = self.cache.get_many(
+            ['membership:stats:hits', 'membership:stats:misses']
+        )
+        return {
+            'hits': values.get('membership:stats:hits', 0),
+            'misses': values.get('membership:stats:misses', 0),
+        }
+
+    def load(self, user_id, kind):
+        model, owner, target = _sources()[kind]
+        with primary():
+            return frozenset(
+                model.objects.filter(**{owner: user_id}).values_list(
+                    target, flat=True
+                )
+            )
+
+    def versions(self, user_id):
+        keys = {self.version_key(user_id, kind): kind for kind in self.kinds}
+        versions = {
+            keys[key]: value
+            for key, value in self.cache.get_many(keys).items()
+        }
+        for key, kind in keys.items():
+            if kind not in versions:
+                # Versions start from the current time, so a version key
+                # that was evicted never comes back with an old number.
+                self.cache.add(key, time.time_ns(), self.timeout)
+                versions[kind] = self.cache.get(key)
+        return versions
+
+    def get(self, user):
+        if user.is_anonymous:
+            return {kind: frozenset() for kind in self.kinds}
+        if not self.enabled:
+            return {kind: self.load(user.pk, kind) for kind in self.kinds}
+        # Versions are read before the sets are loaded: a write committed
+        # in between moves its version on, away from the loaded set.
+        versions = self.versions(user.pk)
+        keys = {
+            self.key(user.pk, kind, version): kind
+            for kind, version in versions.items()
+        }
+        cached = self.cache.get_many(keys)
+        result = {keys[key]: value for key, value in cached.items()}
+        missing = {}
+        for key, kind in keys.items():
+            if kind not in result:
+                result[kind] = missing[key] = self.load(user.pk, kind)
+        if missing:
+            self.cache.set_many(missing, self.timeout)
+        self._count('hits', len(cached))
+        self._count('misses', len(missing))
+        return result
+
+    def for_request(self, request):
+        if not hasattr(request, '_memberships'):
+            request._memberships = self.get(request.user)
+        return request._memberships
+
+    def _invalidate(self, user_id, kinds):
+        for kind in kinds:
+            key = self.version_key(user_id, kind)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.add(key, time.time_ns(), self.timeout)
+
+    def invalidate(self, user_id, *kinds):
+        """Drop the user's cached sets of kinds (all of them by default)
+        once the transaction commits; the next read loads them afresh.
+        """
+        kinds = kinds or self.kinds
+        if self.enabled:
+            transaction.on_commit(lambda: self._invalidate(user_id, kinds))
+
+
+membership_cache = MembershipCache()
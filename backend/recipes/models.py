@@ -1,7 +1,10 @@
+from backend.models import DerivedColumnsMixin
 from django.contrib.auth import get_user_model
 from django.db import models
 from django.db.models import UniqueConstraint
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, RegexValidator
+from .images import DeduplicatingStorage, recipe_image_path
 
 User = get_user_model()
 
@@ -18,9 +21,15 @@ class Ingredient(models.Model):
         verbose_name_plural = "Ингредиенты"
         ordering = ["title",]
         verbose_name = "Ингредиент"
+        constraints = [
+            UniqueConstraint(fields=["title", "unit"], name="unique_ingredient")
+        ]
     def __str__(self):
         return self.title
 
+MAX_TAGS = 63
+
+
 class Tag(models.Model):
     name = models.CharField(
         "Название",
@@ -43,13 +52,52 @@ class Tag(models.Model):
         unique=True,
         max_length=200
     )
+    bit = models.PositiveSmallIntegerField(
+        "Бит в маске тегов",
+        unique=True,
+        editable=False,
+    )
     class Meta:
         verbose_name = "Тег"
         verbose_name_plural = "Теги"
     def __str__(self):
         return self.name
 
-class Recipe(models.Model):
+    @property
+    def mask(self):
+        return 1 << self.bit
+
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            taken = set(Tag.objects.values_list("bit", flat=True))
+            free = [bit for bit in range(MAX_TAGS) if bit not in taken]
+            if not free:
+                raise ValidationError(
+                    f"Нельзя создать больше {MAX_TAGS} тегов"
+                )
+            self.bit = free[0]
+        super().save(*args, **kwargs)
+
+class RecipeQuerySet(models.QuerySet):
+    def with_any_tag(self, tags):
+        """Recipes carrying at least one of tags, matched on tag_mask."""
+        mask = 0
+        for tag in tags:
+            mask |= tag.mask
+        return self.alias(
+            tag_match=models.F("tag_mask").bitand(mask)
+        ).filter(tag_match__gt=0)
+
+    def with_related(self):
+        return self.select_related("author").prefetch_related(
+            "tags",
+            models.Prefetch(
+                "ingredient_list",
+                queryset=IngredientInRecipe.objects.select_related("ingredient"),
+            ),
+        )
+
+class Recipe(DerivedColumnsMixin, models.Model):
     title = models.CharField(
         "Название",
         max_length=200
@@ -64,7 +112,14 @@ class Recipe(models.Model):
     description = models.TextField("Описание")
     image = models.ImageField(
         "Изображение",
-        upload_to="recipes/"
+        upload_to=recipe_image_path,
+        storage=DeduplicatingStorage(),
+    )
+    image_variants = models.JSONField(
+        "Уменьшенные копии изображения",
+        default=dict,
+        blank=True,
+        editable=False,
     )
     cooking_time = models.PositiveSmallIntegerField(
         "Время приготовления",
@@ -83,6 +138,31 @@ class Recipe(models.Model):
         verbose_name="Теги",
         related_name="recipes",
     )
+    tag_mask = models.BigIntegerField(
+        "Маска тегов",
+        default=0,
+        editable=False,
+    )
+    modified = models.DateTimeField(
+        "Дата изменения",
+        auto_now=True,
+        db_index=True,
+    )
+    favorites_count = models.PositiveIntegerField(
+        "Количество в избранном",
+        default=0,
+        editable=False,
+        db_index=True,
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        "Количество в корзинах покупок",
+        default=0,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+    derived_columns = ('tag_mask', 'favorites_count', 'shopping_cart_count')
+
     class Meta:
         ordering = ["-id"]
         verbose_name_plural = "Рецепты"
@@ -155,3 +235,59 @@ class IngredientInRecipe(models.Model):
         verbose_name_plural = "Ингредиенты в рецептах"
     def __str__(self):
         return f"{self.ingredient.title} ({self.ingredient.unit}) - {self.amount}"
+
+class TimelineEntry(models.Model):
+    """A recipe in the subscription feed of a user, written on publish."""
+    user = models.ForeignKey(
+        User,
+        verbose_name="Подписчик",
+        on_delete=models.CASCADE,
+        related_name="timeline",
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name="Рецепт",
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name="Автор",
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи лент"
+        constraints = [
+            UniqueConstraint(fields=["user", "recipe"], name="unique_timeline_entry")
+        ]
+        indexes = [
+            models.Index(fields=["user", "author"], name="timeline_user_author"),
+        ]
+    def __str__(self):
+        return f"\"{self.recipe}\" в ленте {self.user}"
+
+class ShoppingListItem(models.Model):
+    """Running total of one ingredient over the recipes in a user's cart."""
+    user = models.ForeignKey(
+        User,
+        verbose_name="Пользователь",
+        on_delete=models.CASCADE,
+        related_name="shopping_list",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name="Ингредиент",
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    amount = models.IntegerField("Количество", default=0)
+    class Meta:
+        verbose_name = "Позиция списка покупок"
+        verbose_name_plural = "Списки покупок"
+        constraints = [
+            UniqueConstraint(fields=["user", "ingredient"], name="unique_shopping_list_item")
+        ]
+    def __str__(self):
+        return f"{self.ingredient} ({self.amount}) у {self.user}"
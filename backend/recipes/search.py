@@ -0,0 +1,164 @@
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+from .versions import bump_version, get_version
+
+
+def normalize(value):
+    return ' '.join(value.lower().replace('ё', 'е').split())
+
+
+def trigrams(value):
+    padded = f'  {value} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(left, right, limit):
+    """Levenshtein distance, giving up once it is known to exceed limit.
+
+    Only the diagonal band of width 2 * limit + 1 is evaluated.
+    """
+    if abs(len(left) - len(right)) > limit:
+        return limit + 1
+    too_far = limit + 1
+    previous = list(range(len(right) + 1))
+    for i, left_char in enumerate(left, 1):
+        start = max(1, i - limit)
+        stop = min(len(right), i + limit)
+        current = [too_far] * (len(right) + 1)
+        current[0] = i
+        for j in range(start, stop + 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (left_char != right[j - 1]),
+            )
+        if min(current[start - 1:stop + 1]) > limit:
+            return too_far
+        previous = current
+    return min(previous[-1], too_far)
+
+
+class IngredientIndex:
+    """Process-local autocomplete index over the ingredient catalog.
+
+    Matches are ranked in three tiers: name prefix, substring, then fuzzy
+    matches found through shared trigrams and confirmed by edit distance.
+    The index is rebuilt lazily whenever the catalog version stored in the
+    cache changes, so every worker picks up admin edits. Without a shared
+    cache the version changes on every call, and callers should query the
+    database instead (see ``versions_are_shared``).
+    """
+
+    min_similarity = 0.3
+    min_fuzzy_length = 5
+    max_cached_queries = 1024
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+        self._results = OrderedDict()
+
+    def invalidate(self):
+        bump_version('ingredients')
+
+    def _build(self, version):
+        from .models import Ingredient
+
+        ingredients = list(Ingredient.objects.order_by('title', 'id'))
+        entries = sorted(
+            ((normalize(item.title), item) for item in ingredients),
+            key=lambda entry: entry[0],
+        )
+        keys = [key for key, _ in entries]
+        key_grams = [frozenset(trigrams(key)) for key in keys]
+        grams = {}
+        for position, key_gram_set in enumerate(key_grams):
+            for gram in key_gram_set:
+                grams.setdefault(gram, []).append(position)
+        items = [item for _, item in entries]
+        return version, keys, items, key_grams, grams
+
+    def _get_state(self):
+        version = get_version('ingredients')
+        state = self._state
+        if state is not None and state[0] == version:
+            return state
+        with self._lock:
+            if self._state is None or self._state[0] != version:
+                self._state = self._build(version)
+                self._results.clear()
+            return self._state
+
+    def search(self, query, limit=None):
+        query = normalize(query)
+        state = self._get_state()
+        cache_key = (state[0], query, limit)
+        try:
+            result = self._results[cache_key]
+        except KeyError:
+            result = self._search(state, query, limit)
+            with self._lock:
+                self._results[cache_key] = result
+                if len(self._results) > self.max_cached_queries:
+                    self._results.popitem(last=False)
+        return list(result)
+
+    def _search(self, state, query, limit):
+        _, keys, items, key_grams, grams = state
+        if not query:
+            return items[:limit] if limit else list(items)
+
+        seen = set()
+        prefix = []
+        position = bisect_left(keys, query)
+        while position < len(keys) and keys[position].startswith(query):
+            prefix.append(position)
+            position += 1
+        prefix.sort(key=lambda pos: (len(keys[pos]), pos))
+        seen.update(prefix)
+
+        substring = sorted(
+            (
+                (keys[pos].find(query), len(keys[pos]), pos)
+                for pos in range(len(keys))
+                if pos not in seen and query in keys[pos]
+            )
+        )
+        substring = [pos for *_, pos in substring]
+        seen.update(substring)
+
+        fuzzy = []
+        query_grams = trigrams(query)
+        if len(query) >= self.min_fuzzy_length:
+            shared = {}
+            for gram in query_grams:
+                for pos in grams.get(gram, ()):
+                    if pos not in seen:
+                        shared[pos] = shared.get(pos, 0) + 1
+            max_distance = max(1, len(query) // 4)
+            # Each edit destroys at most three trigrams of the query.
+            min_shared = len(query_grams) - 3 * max_distance
+            for pos, count in shared.items():
+                if count < min_shared:
+                    continue
+                key = keys[pos]
+                similarity = count / (
+                    len(query_grams) + len(key_grams[pos]) - count
+                )
+                if similarity < self.min_similarity:
+                    head = key[:len(query)]
+                    if edit_distance(query, head, max_distance) > max_distance:
+                        continue
+                fuzzy.append((-similarity, len(key), pos))
+            fuzzy.sort()
+            fuzzy = [pos for *_, pos in fuzzy]
+
+        ranked = prefix + substring + fuzzy
+        if limit:
+            ranked = ranked[:limit]
+        return [items[pos] for pos in ranked]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,140 @@
+"""Per-user ingredient totals of the shopping cart, kept up by deltas.
+
+Every change to a cart, or to the ingredients of a carted recipe, adds
+its difference to ``ShoppingListItem`` in a single upsert, so reading a
+shopping list is one indexed lookup instead of an aggregate over every
+carted recipe. Totals that reach zero stay in the table and are skipped
+on read. ``find_drift`` and ``rebuild`` compare and restore the totals
+against a fresh aggregate.
+"""
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from .models import IngredientInRecipe, ShoppingCart, ShoppingListItem
+
+User = get_user_model()
+TABLE = ShoppingListItem._meta.db_table
+
+
+def _upsert(select_sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TABLE} (user_id, ingredient_id, amount)'
+            f' {select_sql}'
+            ' ON CONFLICT (user_id, ingredient_id)'
+            f' DO UPDATE SET amount = {TABLE}.amount + EXCLUDED.amount',
+            params,
+        )
+
+
+def _placeholders(count):
+    return ', '.join(['%s'] * count)
+
+
+def _shift_recipes(user_id, recipe_ids, sign):
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    _upsert(
+        f'SELECT %s, ingredient_id, {sign:d} * SUM(amount)'
+        f' FROM {IngredientInRecipe._meta.db_table}'
+        f' WHERE recipe_id IN ({_placeholders(len(recipe_ids))})'
+        ' GROUP BY ingredient_id',
+        [user_id, *recipe_ids],
+    )
+
+
+def add_recipes(user_id, recipe_ids):
+    """Add the ingredients of recipes just put in the user's cart."""
+    _shift_recipes(user_id, recipe_ids, 1)
+
+
+def remove_recipes(user_id, recipe_ids):
+    """Subtract the ingredients of recipes taken out of the user's cart."""
+    _shift_recipes(user_id, recipe_ids, -1)
+
+
+def change_recipe(recipe_id, deltas):
+    """Apply ingredient amount deltas of a recipe to every cart holding it.
+
+    ``deltas`` maps ingredient ids to the change of their amount.
+    """
+    deltas = [(pk, delta) for pk, delta in deltas.items() if delta]
+    if not deltas:
+        return
+    values = ' UNION ALL '.join(
+        ['SELECT %s AS ingredient_id, %s AS amount'] * len(deltas)
+    )
+    _upsert(
+        'SELECT c.user_id, d.ingredient_id, d.amount'
+        f' FROM {ShoppingCart._meta.db_table} c CROSS JOIN ({values}) d'
+        ' WHERE c.recipe_id = %s',
+        [value for delta in deltas for value in delta] + [recipe_id],
+    )
+
+
+def _aggregate(user_ids=None):
+    if user_ids is None:
+        lookup = {'recipe__shopping_recipes__isnull': False}
+    else:
+        lookup = {'recipe__shopping_recipes__user__in': user_ids}
+    return IngredientInRecipe.objects.filter(**lookup).values_list(
+        'recipe__shopping_recipes__user', 'ingredient_id'
+    ).annotate(total=Sum('amount')).order_by()
+
+
+def expected(user_ids):
+    """Aggregate the cart totals of the given users from scratch."""
+    totals = defaultdict(dict)
+    for user_id, ingredient_id, total in _aggregate(user_ids):
+        totals[user_id][ingredient_id] = total
+    return totals
+
+
+def stored(user_ids):
+    totals = defaultdict(dict)
+    rows = ShoppingListItem.objects.filter(
+        user__in=user_ids, amount__gt=0
+    ).values_list('user_id', 'ingredient_id', 'amount')
+    for user_id, ingredient_id, amount in rows:
+        totals[user_id][ingredient_id] = amount
+    return totals
+
+
+def _user_batches(batch_size):
+    user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(user_ids), batch_size):
+        yield user_ids[start:start + batch_size]
+
+
+def find_drift(batch_size=500):
+    """Ids of users whose stored totals differ from a fresh aggregate."""
+    drifted = []
+    for user_ids in _user_batches(batch_size):
+        fresh, current = expected(user_ids), stored(user_ids)
+        drifted.extend(
+            user_id for user_id in user_ids
+            if fresh.get(user_id, {}) != current.get(user_id, {})
+        )
+    return drifted
+
+
+@transaction.atomic
+def rebuild(user_ids=None):
+    """Recompute the totals of the given users, or of everyone."""
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user__in=user_ids)
+    items.delete()
+    return len(ShoppingListItem.objects.bulk_create(
+        [
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, amount=total
+            )
+            for user_id, ingredient_id, total in _aggregate(user_ids)
+        ],
+        batch_size=1000,
+    ))
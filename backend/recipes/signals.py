@@ -0,0 +1,169 @@
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_migrate,
+                                      post_save, pre_delete, pre_save)
+from django.dispatch import receiver
+
+from users.models import Subscribe
+
+from . import fulltext, shopping_list, timeline
+from .counters import refresh_tag_masks, shift
+from .images import schedule_variants, variants_are_current
+from .memberships import CART, FAVORITES, SUBSCRIPTIONS, membership_cache
+from .models import Favourite, Ingredient, Recipe, ShoppingCart, Tag
+from .search import ingredient_index
+from .versions import bump_version
+
+RECIPE_COUNTERS = {
+    Favourite: 'favorites_count',
+    ShoppingCart: 'shopping_cart_count',
+}
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    bump_version('tags')
+
+
+@receiver(post_delete, sender=Tag)
+def clear_tag_bit(sender, instance, **kwargs):
+    # The links are gone by now; free the bit before a new tag reuses it.
+    Recipe.objects.alias(
+        tag_match=F('tag_mask').bitand(instance.mask)
+    ).filter(tag_match__gt=0).update(
+        tag_mask=F('tag_mask').bitand(~instance.mask)
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def refresh_recipe_tag_mask(sender, instance, action, reverse, pk_set,
+                            **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        refresh_tag_masks([instance.pk])
+    elif action == 'post_clear':
+        Recipe.objects.update(tag_mask=F('tag_mask').bitand(~instance.mask))
+    elif pk_set:
+        refresh_tag_masks(pk_set)
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_image_variants(sender, instance, **kwargs):
+    if not instance.image or variants_are_current(instance):
+        return
+    if instance.image_variants:
+        Recipe.objects.filter(pk=instance.pk).update(image_variants={})
+        instance.image_variants = {}
+    schedule_variants(instance.pk)
+
+
+@receiver(post_migrate)
+def install_fulltext_index(sender, **kwargs):
+    if sender.name == 'recipes':
+        fulltext.install()
+
+
+@receiver(post_save, sender=Recipe)
+def index_saved_recipe(sender, instance, update_fields, **kwargs):
+    if update_fields is None or {'title', 'description'} & set(update_fields):
+        fulltext.index_recipes([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_deleted_recipe(sender, instance, **kwargs):
+    fulltext.remove_recipes([instance.pk])
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_author(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance._previous_author_id = Recipe.objects.filter(
+            pk=instance.pk
+        ).values_list('author_id', flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+def count_saved_recipe(sender, instance, created, **kwargs):
+    if created:
+        shift('recipes_count', instance.author_id, 1)
+        return
+    previous = getattr(instance, '_previous_author_id', instance.author_id)
+    if previous != instance.author_id:
+        shift('recipes_count', previous, -1)
+        shift('recipes_count', instance.author_id, 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def count_deleted_recipe(sender, instance, **kwargs):
+    shift('recipes_count', instance.author_id, -1)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_published_recipe(sender, instance, created, **kwargs):
+    if created:
+        timeline.schedule(timeline.fan_out, [instance.pk], instance.author_id)
+
+
+@receiver(post_save, sender=Favourite)
+@receiver(post_save, sender=ShoppingCart)
+def add_recipe_membership(sender, instance, created, **kwargs):
+    if created:
+        kind = FAVORITES if sender is Favourite else CART
+        membership_cache.invalidate(instance.user_id, kind)
+        shift(RECIPE_COUNTERS[sender], instance.recipe_id, 1)
+
+
+@receiver(post_delete, sender=Favourite)
+@receiver(post_delete, sender=ShoppingCart)
+def discard_recipe_membership(sender, instance, **kwargs):
+    kind = FAVORITES if sender is Favourite else CART
+    membership_cache.invalidate(instance.user_id, kind)
+    shift(RECIPE_COUNTERS[sender], instance.recipe_id, -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        shopping_list.add_recipes(instance.user_id, [instance.recipe_id])
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    # Before the delete: when a whole recipe goes, its ingredient rows
+    # may be deleted ahead of the cart rows.
+    shopping_list.remove_recipes(instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_save, sender=Subscribe)
+def add_subscription_membership(sender, instance, created, **kwargs):
+    if created:
+        membership_cache.invalidate(instance.subscriber_id, SUBSCRIPTIONS)
+        shift('subscribers_count', instance.author_id, 1)
+
+
+@receiver(post_delete, sender=Subscribe)
+def discard_subscription_membership(sender, instance, **kwargs):
+    membership_cache.invalidate(instance.subscriber_id, SUBSCRIPTIONS)
+    shift('subscribers_count', instance.author_id, -1)
+
+
+@receiver(post_save, sender=Subscribe)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.schedule(
+            timeline.backfill, instance.subscriber_id, instance.author_id
+        )
+
+
+@receiver(post_delete, sender=Subscribe)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.schedule(
+        timeline.prune, instance.subscriber_id, instance.author_id
+    )
@@ -0,0 +1,136 @@
+"""Snowball stemmer for Russian, used where the database has none.
+
+PostgreSQL stems with its own ``russian`` text search configuration; the
+SQLite full-text index is fed words reduced by :func:`stem` instead.
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+WORD_RE = re.compile(r'\w+')
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им',
+    'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая',
+    'яя', 'ою', 'ею',
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ('ся', 'сь')
+VERB = (
+    (
+        'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+        'ет', 'ют', 'ны', 'ть', 'ешь', 'нно',
+    ),
+    (
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+        'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+        'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+    ),
+)
+NOUN = (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и',
+    'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о',
+    'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+)
+DERIVATIONAL = ('ост', 'ость')
+SUPERLATIVE = ('ейш', 'ейше')
+
+
+def _regions(word):
+    """Return the start of the RV and R2 regions."""
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _strip(word, start, endings, after=None):
+    """Remove the longest ending lying at or after start.
+
+    With ``after`` the ending must also follow one of those letters.
+    Returns the shortened word, or None when nothing matched.
+    """
+    for ending in sorted(endings, key=len, reverse=True):
+        cut = len(word) - len(ending)
+        if word.endswith(ending) and cut >= start:
+            if after is not None and (cut <= start or word[cut - 1] not in after):
+                return None
+            return word[:cut]
+    return None
+
+
+def _strip_grouped(word, start, groups):
+    """Like _strip for endings split into an а/я-preceded and a free group."""
+    first, second = groups
+    longest = max(
+        (
+            ending for ending in first + second
+            if word.endswith(ending) and len(word) - len(ending) >= start
+        ),
+        key=len,
+        default=None,
+    )
+    if longest is None:
+        return None
+    after = 'ая' if longest in first and longest not in second else None
+    return _strip(word, start, (longest,), after)
+
+
+def _strip_adjectival(word, start):
+    stripped = _strip(word, start, ADJECTIVE)
+    if stripped is None:
+        return None
+    return _strip_grouped(stripped, start, PARTICIPLE) or stripped
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+
+    stripped = _strip_grouped(word, rv, PERFECTIVE_GERUND)
+    if stripped is None:
+        word = _strip(word, rv, REFLEXIVE) or word
+        for step in (
+            lambda value: _strip_adjectival(value, rv),
+            lambda value: _strip_grouped(value, rv, VERB),
+            lambda value: _strip(value, rv, NOUN),
+        ):
+            stripped = step(word)
+            if stripped is not None:
+                break
+    if stripped is not None:
+        word = stripped
+
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    word = _strip(word, r2, DERIVATIONAL) or word
+
+    superlative = _strip(word, rv, SUPERLATIVE)
+    if superlative is not None:
+        word = superlative
+    if word.endswith('нн') and len(word) - 1 >= rv:
+        word = word[:-1]
+    elif superlative is None and word.endswith('ь') and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
+
+
+def stem_text(text):
+    return ' '.join(stem(word) for word in WORD_RE.findall(text or ''))
@@ -0,0 +1,145 @@
+"""Subscription feeds: fan-out on write, merged on read for big authors.
+
+Publishing a recipe copies it into the timeline of every subscriber of
+its author, so a feed page is a range scan over one user's entries.
+Authors with at least ``FEED_FANOUT_LIMIT`` subscribers are skipped on
+write; their recipes are read from the recipe table and merged into the
+page instead. Subscribing backfills the author's recipes and
+unsubscribing prunes them, both in a background thread after commit.
+"""
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from users.models import Subscribe
+
+from .models import Recipe, TimelineEntry
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='timeline')
+
+
+def fanout_limit():
+    return settings.FEED_FANOUT_LIMIT
+
+
+def _fill(condition, params):
+    """Copy recipes of followed authors into timelines in one statement."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table}'
+            ' (user_id, recipe_id, author_id)'
+            ' SELECT s.subscriber_id, r.id, r.author_id'
+            f' FROM {Subscribe._meta.db_table} s'
+            f' JOIN {Recipe._meta.db_table} r ON r.author_id = s.author_id'
+            f' WHERE {condition}'
+            ' ON CONFLICT DO NOTHING',
+            params,
+        )
+        return cursor.rowcount
+
+
+def _fans_out(author_id):
+    return User.objects.filter(
+        pk=author_id, subscribers_count__lt=fanout_limit()
+    ).exists()
+
+
+def fan_out(recipe_ids, author_id):
+    """Write freshly published recipes into the subscribers' timelines."""
+    recipe_ids = list(recipe_ids)
+    if author_id is None or not recipe_ids or not _fans_out(author_id):
+        return 0
+    return _fill(
+        f'r.id IN ({", ".join(["%s"] * len(recipe_ids))})', recipe_ids
+    )
+
+
+def backfill(subscriber_id, author_id):
+    if not _fans_out(author_id):
+        return 0
+    return _fill(
+        's.subscriber_id = %s AND s.author_id = %s',
+        [subscriber_id, author_id],
+    )
+
+
+def backfill_author(author_id):
+    """Fill every subscriber once an author drops under the limit."""
+    return _fill('s.author_id = %s', [author_id])
+
+
+def prune(subscriber_id, author_id):
+    deleted, _ = TimelineEntry.objects.filter(
+        user_id=subscriber_id, author_id=author_id
+    ).delete()
+    # The unsubscribe just moved the author back under the limit: their
+    # recipes stop being merged on read, so they go into the timelines.
+    if User.objects.filter(
+        pk=author_id, subscribers_count=fanout_limit() - 1
+    ).exists():
+        backfill_author(author_id)
+    return deleted
+
+
+def rebuild():
+    """Refill every timeline from the subscriptions."""
+    with transaction.atomic():
+        TimelineEntry.objects.all().delete()
+        return _fill(
+            f'r.author_id IN (SELECT id FROM {User._meta.db_table}'
+            ' WHERE subscribers_count < %s)',
+            [fanout_limit()],
+        )
+
+
+def _run(task, *args):
+    try:
+        task(*args)
+    except Exception:
+        logger.exception('Не удалось обновить ленты: %s%s',
+                         task.__name__, args)
+    finally:
+        connection.close()
+
+
+def schedule(task, *args):
+    """Run a timeline task once the current transaction commits."""
+    if getattr(settings, 'FEED_FANOUT_ASYNC', True):
+        transaction.on_commit(lambda: _executor.submit(_run, task, *args))
+    else:
+        transaction.on_commit(lambda: task(*args))
+
+
+def feed_ids(user, before, limit):
+    """Newest recipe ids in the feed of user below the ``before`` id.
+
+    One range scan over the user's timeline, plus one over the recipes of
+    followed authors too big to fan out, merged newest first.
+    """
+    timeline = TimelineEntry.objects.filter(user=user)
+    merged = Recipe.objects.filter(
+        author__in=Subscribe.objects.filter(
+            subscriber=user, author__subscribers_count__gte=fanout_limit()
+        ).values('author_id')
+    )
+    if before is not None:
+        timeline = timeline.filter(recipe_id__lt=before)
+        merged = merged.filter(pk__lt=before)
+    sources = (
+        timeline.order_by('-recipe_id').values_list('recipe_id', flat=True),
+        merged.order_by('-id').values_list('id', flat=True),
+    )
+    ids = []
+    for recipe_id in heapq.merge(
+        *(list(source[:limit]) for source in sources), reverse=True
+    ):
+        if not ids or ids[-1] != recipe_id:
+            ids.append(recipe_id)
+    return ids[:limit]
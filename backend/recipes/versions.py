@@ -0,0 +1,52 @@
+import time
+
+from backend.caches import is_shared
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+
+
+def versions_are_shared():
+    """Whether every worker sees the versions the others bump."""
+    return is_shared(DEFAULT_CACHE_ALIAS)
+
+
+def version_key(name):
+    return f'recipes:{name}:version'
+
+
+def get_version(name):
+    """Current version of a reference table.
+
+    Versions are microsecond timestamps of the last change, so they double
+    as a Last-Modified value. A worker that finds no version in the cache
+    starts from the current time, which can only make clients refetch.
+    Without a shared cache a bump would stay in the worker that made it, so
+    every call returns a new version and nothing keyed on one is reused.
+    """
+    if not versions_are_shared():
+        return time.time_ns() // 1000
+    key = version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns() // 1000, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    if not versions_are_shared():
+        return get_version(name)
+    key = version_key(name)
+    version = max(time.time_ns() // 1000, get_version(name) + 1)
+    cache.set(key, version, None)
+    return version
+
+
+def get_versions(names):
+    if not versions_are_shared():
+        return tuple(get_version(name) for name in names)
+    keys = {version_key(name): name for name in names}
+    found = cache.get_many(keys)
+    versions = {keys[key]: value for key, value in found.items()}
+    for name in set(names) - set(versions):
+        versions[name] = get_version(name)
+    return tuple(versions[name] for name in names)
@@ -10,7 +10,9 @@ class UserAdmin(UserAdmin):
         'username',
         'first_name',
         'last_name',
-        'email'
+        'email',
+        'recipes_count',
+        'subscribers_count',
     )
     list_filter = ('first_name', 'email')
 
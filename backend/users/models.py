@@ -1,15 +1,27 @@
+from backend.models import DerivedColumnsMixin
 from django.db.models import UniqueConstraint
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
-class CustomUser(AbstractUser):
+class CustomUser(DerivedColumnsMixin, AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
+    derived_columns = ('recipes_count', 'subscribers_count')
     email = models.EmailField(
         verbose_name='Email Address',
         unique=True,
         max_length=254,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Пользователь'
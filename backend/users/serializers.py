@@ -1,12 +1,14 @@
 from users.models import Subscribe
+from recipes.memberships import SUBSCRIPTIONS, membership_cache
 from recipes.models import Recipe
 from rest_framework.serializers import ModelSerializer
 from rest_framework.exceptions import ValidationError
 from rest_framework import status
 from django.contrib.auth import get_user_model
-from rest_framework.fields import SerializerMethodField
+from rest_framework.fields import CharField, SerializerMethodField
 from drf_extra_fields.fields import Base64ImageField
-from api.serializers import CustomUserSerializer
+from api.serializers import (CustomUserSerializer, ImageVariantsField,
+                             RecipeRowsMixin, RowListSerializer)
 from djoser.serializers import UserCreateSerializer, UserSerializer
 
 User = get_user_model()
@@ -36,27 +38,30 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, object):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Subscribe.objects.filter(user=user, author=object).exists()
+        if hasattr(object, 'is_subscribed'):
+            return object.is_subscribed
+        memberships = membership_cache.for_request(self.context['request'])
+        return object.id in memberships[SUBSCRIPTIONS]
 
 
-class RecipeShortSerializer(ModelSerializer):
+class RecipeShortSerializer(RecipeRowsMixin, ModelSerializer):
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
+    name = CharField(source='title', read_only=True)
 
     class Meta:
         model = Recipe
         fields = (
             'id',
             'image',
+            'image_variants',
             'name',
             'cooking_time'
         )
+        list_serializer_class = RowListSerializer
 
 
 class SubscribeSerializer(CustomUserSerializer):
-    recipes_count = SerializerMethodField()
     recipes = SerializerMethodField()
 
     class Meta(CustomUserSerializer.Meta):
@@ -68,7 +73,7 @@ class SubscribeSerializer(CustomUserSerializer):
     def validate(self, data):
         user = self.context.get('request').user
         author = self.instance
-        if Subscribe.objects.filter(author=author, user=user).exists():
+        if Subscribe.objects.filter(author=author, subscriber=user).exists():
             raise ValidationError(
                 code=status.HTTP_400_BAD_REQUEST,
                 detail='Вы уже подписаны на этого пользователя!',
@@ -81,6 +86,10 @@ class SubscribeSerializer(CustomUserSerializer):
         return data
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'limited_recipes'):
+            return RecipeShortSerializer(
+                obj.limited_recipes, many=True, read_only=True
+            ).data
         request = self.context.get('request')
         recipes = obj.recipes.all()
         limit = request.GET.get('recipes_limit')
@@ -88,6 +97,3 @@ class SubscribeSerializer(CustomUserSerializer):
             recipes = recipes[:int(limit)]
         serializer = RecipeShortSerializer(recipes, many=True, read_only=True)
         return serializer.data
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
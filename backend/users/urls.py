@@ -1,4 +1,5 @@
 from .views import CustomUserViewSet
+from api import toggles
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
@@ -11,6 +12,7 @@ router.register('users', CustomUserViewSet)
 
 urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
-    path('', include('djoser.urls')),
+    path('users/<int:id>/subscribe/', toggles.subscribe),
     path('', include(router.urls)),
+    path('', include('djoser.urls')),
 ]
@@ -371,6 +371,35 @@ class Api {
     ).then(this.checkResponse)
   }
 
+  updateRecipesBulk ({ target = 'shopping_cart', action = 'add', ids }) {
+    const token = localStorage.getItem('token')
+    return fetch(
+      `/api/recipes/bulk/`,
+      {
+        method: 'POST',
+        headers: {
+          ...this._headers,
+          'authorization': `Token ${token}`
+        },
+        body: JSON.stringify({ target, action, recipes: ids })
+      }
+    ).then(this.checkResponse)
+  }
+
+  getShoppingList () {
+    const token = localStorage.getItem('token')
+    return fetch(
+      `/api/recipes/shopping_list/`,
+      {
+        method: 'GET',
+        headers: {
+          ...this._headers,
+          'authorization': `Token ${token}`
+        }
+      }
+    ).then(this.checkResponse)
+  }
+
   deleteRecipe ({ recipe_id }) {
     const token = localStorage.getItem('token')
     return fetch(